@@ -0,0 +1,78 @@
+"""Measure the cost of an idle scanner: wakeups and CPU time per second of
+the scanning thread, and the delay of stop(), comparing polling with a
+100 ms timeout (the former RuuviDaemon.scan loop) to waiting in a
+selector (ruuvitag.backends.Backend._readable).
+
+Runs offline, a socket pair stands in for the HCI socket. Linux only, as
+it uses per-thread resource usage. Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/idle.py [seconds]
+"""
+
+import resource
+import socket
+import sys
+import threading
+import time
+
+from ruuvitag.backends import Backend
+
+
+class SocketBackend(Backend):
+    """Reads a socket without receiving anything, like an idle HCIBackend."""
+
+    def __init__(self, sock, polling):
+        super(SocketBackend, self).__init__()
+        self.sock = sock
+        self.polling = polling
+
+    def __iter__(self):
+        if self.polling:
+            self.sock.settimeout(0.1)
+            while not self._stop.is_set():
+                try:
+                    yield self.sock.recv(260)
+                except socket.timeout:
+                    continue
+        else:
+            self.sock.setblocking(False)
+            for _ in self._readable(self.sock):
+                yield self.sock.recv(260)
+
+
+def run(polling, seconds):
+    receiver, sender = socket.socketpair()
+    backend = SocketBackend(receiver, polling)
+    usage = {}
+
+    def scan():
+        before = resource.getrusage(resource.RUSAGE_THREAD)
+        for _ in backend:
+            pass
+        after = resource.getrusage(resource.RUSAGE_THREAD)
+        usage["wakeups"] = after.ru_nvcsw - before.ru_nvcsw
+        usage["cpu"] = (after.ru_utime + after.ru_stime) - (
+            before.ru_utime + before.ru_stime
+        )
+
+    thread = threading.Thread(target=scan)
+    backend.start()
+    thread.start()
+    time.sleep(seconds)
+    stopped = time.perf_counter()
+    backend.stop()
+    thread.join()
+    latency = time.perf_counter() - stopped
+    receiver.close()
+    sender.close()
+    return usage["wakeups"] / seconds, usage["cpu"] / seconds, latency
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, polling in (("polling 100 ms", True), ("selector", False)):
+        wakeups, cpu, latency = run(polling, seconds)
+        print(
+            "%-16s %8.1f wakeups/s %8.3f ms CPU/s %8.1f ms stop latency"
+            % (name, wakeups, cpu * 1000, latency * 1000)
+        )
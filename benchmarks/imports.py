@@ -0,0 +1,44 @@
+"""Measure cold import time of ruuvitag entry points, each in a fresh
+interpreter, relative to starting an interpreter that imports nothing.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/imports.py
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+STATEMENTS = [
+    "import ruuvitag",
+    "from ruuvitag.decoder import decode",
+    "from ruuvitag import RuuviTag",
+    "from ruuvitag import RuuviDaemon",
+    "import arrow",
+    "import bitstring",
+    "from bluepy import btle",
+]
+
+
+def run(statement, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.check_call([sys.executable, "-c", statement])
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations)
+
+
+if __name__ == "__main__":
+    repeat = 15
+    baseline = run("pass", repeat)
+    print("%-40s %8.1f ms" % ("(interpreter startup)", baseline * 1000))
+    for statement in STATEMENTS:
+        try:
+            duration = run(statement, repeat) - baseline
+        except subprocess.CalledProcessError:
+            print("%-40s %11s" % (statement, "failed"))
+            continue
+        print("%-40s %+8.1f ms" % (statement, duration * 1000))
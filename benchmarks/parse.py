@@ -0,0 +1,51 @@
+"""Compare packets/second of the struct-based RuuviTag.parse against the
+BitArray-based fallback parser.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/parse.py
+"""
+
+import timeit
+
+from ruuvitag import RuuviTag
+
+PAYLOADS = {
+    "format 3": bytes.fromhex("0201061bff990403291a1ece1efc18f94202ca0b53"),
+    "format 5": bytes.fromhex(
+        "0201061bff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f"
+    ),
+    "non-ruuvi": bytes.fromhex("0201061aff4c000215e2c56db5dffb48d2b060d0f5a71096e0"),
+}
+
+PARSERS = {
+    "struct": RuuviTag.parse,
+    "bitarray": RuuviTag._parse_bitarray,
+}
+
+
+def packets_per_second(parser, data, number=20000, repeat=5):
+    best = min(
+        timeit.repeat(
+            lambda: parser("f7:bf:87:46:6f:ee", data), number=number, repeat=repeat
+        )
+    )
+    return number / best
+
+
+if __name__ == "__main__":
+    for payload_name, data in PAYLOADS.items():
+        results = {
+            name: packets_per_second(parser, data) for name, parser in PARSERS.items()
+        }
+        print(
+            "%-10s %s, speedup %.1fx"
+            % (
+                payload_name,
+                ", ".join(
+                    "%s: %.0f packets/s" % (name, value)
+                    for name, value in results.items()
+                ),
+                results["struct"] / results["bitarray"],
+            )
+        )
@@ -0,0 +1,71 @@
+"""Measure decoding throughput of synthetic traffic of many tags, in the
+calling process with ruuvitag.batch.parse_many and on worker processes
+with ruuvitag.pipeline.ShardedDecoder, packing the packets in decode() or
+beforehand into its shared buffers (decode_buffers). Scaling with workers
+beyond the number of CPUs can't be shown, worker counts above it only
+measure the overhead.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/pipeline.py [packets] [tags]
+"""
+
+import multiprocessing
+import sys
+import time
+
+from parse import PAYLOADS
+
+from ruuvitag.batch import as_matrix, parse_many
+from ruuvitag.pipeline import ShardedDecoder, pack_addresses
+
+
+def traffic(packets, tags):
+    """Returns (addresses, payloads) of packets from tags, interleaved."""
+    addresses, payloads = [], []
+    for i in range(packets):
+        tag = i % tags
+        payload = bytearray(PAYLOADS["format 5"])
+        payload[-8:-6] = (i // tags % 65536).to_bytes(2, "big")
+        addresses.append(
+            "f7:bf:87:%02x:%02x:%02x" % (tag >> 16, tag >> 8 & 255, tag & 255)
+        )
+        payloads.append(bytes(payload))
+    return addresses, payloads
+
+
+def measure(function, addresses, payloads, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(addresses, payloads)
+        best = min(best, time.perf_counter() - started)
+    return len(addresses) / best
+
+
+if __name__ == "__main__":
+    packets = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    tags = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    addresses, payloads = traffic(packets, tags)
+
+    print(
+        "%-20s %10.0f packets/s"
+        % ("parse_many", measure(parse_many, addresses, payloads))
+    )
+    print("%i CPUs" % multiprocessing.cpu_count())
+    for workers in sorted({1, 2, 4, multiprocessing.cpu_count()}):
+        with ShardedDecoder(workers, capacity=len(addresses)) as decoder:
+            rate = measure(decoder.decode, addresses, payloads)
+            packed, matrix, lengths = decoder.buffers()
+            pack_addresses(addresses, out=packed)
+            lengths[:] = as_matrix(payloads, out=matrix)[1]
+            buffers_rate = measure(
+                lambda addresses, payloads: decoder.decode_buffers(len(addresses)),
+                addresses,
+                payloads,
+            )
+            del packed, matrix, lengths
+        print(
+            "%-20s %10.0f packets/s, decode_buffers %10.0f packets/s"
+            % ("workers=%i" % workers, rate, buffers_rate)
+        )
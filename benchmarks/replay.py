@@ -0,0 +1,68 @@
+"""Replay a capture file through RuuviDaemon.update_tag and report
+packets/second. Without a capture file, a synthetic one is generated.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/replay.py [capture] [--speed SPEED]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from ruuvitag import RuuviDaemon
+from ruuvitag.backends import Advertisement
+from ruuvitag.capture import CaptureWriter, replay
+
+
+def synthetic_capture(path, packets=100000, tags=50):
+    """Write a capture of format 5 advertisements from a number of tags,
+    one advertisement per tag per second, with a third of the packets
+    from other devices."""
+    header = bytes.fromhex("0201061bff990405")
+    addresses = ["f7:bf:87:46:%02x:%02x" % divmod(i, 256) for i in range(tags)]
+    started = int(time.time() * 1e9)
+    with CaptureWriter(path) as writer:
+        for i in range(packets):
+            timestamp = started + i * 1000000000 // tags
+            if i % 3 == 2:
+                writer.write(
+                    Advertisement(
+                        "c0:ff:ee:00:00:%02x" % (i % 256),
+                        -80,
+                        bytes.fromhex("0201061aff4c000215") + os.urandom(21),
+                    ),
+                    timestamp,
+                )
+                continue
+            payload = bytearray(os.urandom(23))
+            payload[15:17] = (i // tags % 65536).to_bytes(2, "big")
+            writer.write(
+                Advertisement(
+                    addresses[i % tags], random.randint(-90, -40), header + payload
+                ),
+                timestamp,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("capture", nargs="?")
+    parser.add_argument("--speed", type=float, default=None)
+    args = parser.parse_args()
+
+    path = args.capture
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.ruuvicap")
+        synthetic_capture(path)
+
+    daemon = RuuviDaemon()
+    started = time.time()
+    count = replay(daemon, path, speed=args.speed)
+    elapsed = time.time() - started
+    print(
+        "%i packets, %i tags in %.02fs: %.0f packets/s"
+        % (count, len(daemon.tags), elapsed, count / elapsed)
+    )
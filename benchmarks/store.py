@@ -0,0 +1,58 @@
+"""Measure sustained inserts/second of ruuvitag.store.SQLiteStore, for
+several batch sizes, and the time of querying a day of a tag.
+
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/store.py [measurements] [tags]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from time import time_ns
+
+from parse import PAYLOADS
+
+from ruuvitag.ruuvitag import RuuviTag
+from ruuvitag.store import SQLiteStore
+
+
+def run(path, measurements, tags, batch_size):
+    store = SQLiteStore(path, batch_size=batch_size, max_buffer=measurements)
+    tags = [
+        RuuviTag.parse("f7:bf:87:46:%02x:%02x" % divmod(i, 256), PAYLOADS["format 5"])
+        for i in range(tags)
+    ]
+    # One measurement per tag per second, ending now
+    started_ns = time_ns() - measurements // len(tags) * 1000000000
+
+    store.start()
+    started = time.perf_counter()
+    for i in range(measurements):
+        tag = tags[i % len(tags)]
+        tag.last_seen_ns = started_ns + i // len(tags) * 1000000000
+        tag.measurement_sequence = i // len(tags)
+        store(tag)
+    store.stop()
+    duration = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = store.query(tags[0].address, start_ns=time_ns() - 86400 * 1000000000)
+    query = time.perf_counter() - started
+    return store.rows_written / duration, store.rows_dropped, len(rows), query
+
+
+if __name__ == "__main__":
+    measurements = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    tags = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    for batch_size in (1, 100, 1000, 10000):
+        with tempfile.TemporaryDirectory() as directory:
+            count = measurements if batch_size > 1 else measurements // 100
+            rate, dropped, rows, query = run(
+                os.path.join(directory, "ruuvitag.db"), count, tags, batch_size
+            )
+        print(
+            "batch_size=%-6i %10.0f inserts/s %6i dropped, "
+            "query of %i rows %.1f ms" % (batch_size, rate, dropped, rows, query * 1000)
+        )
@@ -0,0 +1,160 @@
+"""Benchmark suite for the hot paths of ruuvitag, running offline on
+synthetic payloads.
+
+For each case reports packets/second, the peak of transient memory
+allocated while handling one packet, and memory blocks retained per
+packet. Results are written as JSON, so runs of different versions can
+be compared. Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/suite.py --output before.json
+    PYTHONPATH=. python benchmarks/suite.py --output after.json --compare before.json
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+from parse import PAYLOADS
+
+from ruuvitag import RuuviDaemon, RuuviTag
+from ruuvitag.backends import Advertisement, FakeBackend
+from ruuvitag.decoder import decode
+
+ADDRESS = "f7:bf:87:46:6f:ee"
+
+
+def devices(count, data=PAYLOADS["format 5"]):
+    """Returns advertisements of count tags, with an unique address and
+    measurement_sequence each."""
+    result = []
+    for i in range(count):
+        payload = bytearray(data)
+        payload[-8:-6] = (i % 65536).to_bytes(2, "big")
+        result.append(
+            Advertisement("f7:bf:87:46:%02x:%02x" % divmod(i, 256), -60, bytes(payload))
+        )
+    return result
+
+
+def scan(advertisements=devices(100)):
+    for _ in RuuviTag.scan(timeout=None, backend=FakeBackend(advertisements)):
+        pass
+
+
+def cases():
+    """Returns {name: (function, packets per call)}."""
+    result = {}
+    for name, data in PAYLOADS.items():
+        key = name.replace(" ", "")
+        result["parse/%s" % key] = (lambda data=data: RuuviTag.parse(ADDRESS, data), 1)
+        result["decode/%s" % key] = (lambda data=data: decode(ADDRESS, data), 1)
+
+    tag = RuuviTag.parse(ADDRESS, PAYLOADS["format 5"])
+    values = tag.as_dict()
+    measurement = decode(ADDRESS, PAYLOADS["format 5"])
+    result["tag/update"] = (lambda: tag.update(**values), 1)
+    result["tag/apply"] = (lambda: tag.apply(measurement), 1)
+    result["tag/as_dict"] = (tag.as_dict, 1)
+
+    for count in (1, 200):
+        daemon = RuuviDaemon()
+        packets = itertools.cycle(devices(count))
+        result["daemon/update_tag/%itags" % count] = (
+            lambda daemon=daemon, packets=packets: daemon.update_tag(next(packets)),
+            1,
+        )
+
+    result["scan/fake100"] = (scan, 100)
+    return result
+
+
+def measure(function, packets, number=2000, repeat=5):
+    """Returns the results of a single case."""
+    # Warm up caches and the daemon's tags
+    for _ in range(100):
+        function()
+
+    best = min(timeit.repeat(function, number=number, repeat=repeat))
+
+    peak = 0
+    for _ in range(10):
+        tracemalloc.start()
+        function()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    blocks = sys.getallocatedblocks()
+    for _ in range(number):
+        function()
+    retained = sys.getallocatedblocks() - blocks
+
+    return {
+        "packets_per_second": number * packets / best,
+        "peak_bytes_per_packet": peak / float(packets),
+        "retained_blocks_per_packet": retained / float(number * packets),
+    }
+
+
+def revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "describe", "--always", "--dirty"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", help="write results as JSON to a file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument("--filter", default="", help="run cases containing this")
+    args = parser.parse_args()
+
+    results = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cases": {},
+    }
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["cases"]
+
+    for name, (function, packets) in cases().items():
+        if args.filter not in name:
+            continue
+        result = results["cases"][name] = measure(function, packets)
+        line = "%-28s %10.0f packets/s %8.0f B peak %6.2f blocks retained" % (
+            name,
+            result["packets_per_second"],
+            result["peak_bytes_per_packet"],
+            result["retained_blocks_per_packet"],
+        )
+        if name in previous:
+            line += "  %.2fx" % (
+                result["packets_per_second"] / previous[name]["packets_per_second"]
+            )
+        print(line, file=sys.stderr)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
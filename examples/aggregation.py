@@ -0,0 +1,39 @@
+from ruuvitag import RuuviDaemon
+from ruuvitag.aggregate import Aggregator
+
+
+def print_window(window):
+    # Print the statistics of each tag once per minute
+    temperature = window.summaries.get("temperature")
+    if temperature:
+        print(
+            "%s: %i samples, %.02f..%.02fc, mean %.02fc"
+            % (
+                window.address,
+                temperature.count,
+                temperature.min,
+                temperature.max,
+                temperature.mean,
+            )
+        )
+
+
+if __name__ == "__main__":
+    import time
+
+    # Aggregate measurements into one minute tumbling windows,
+    # for a sliding window updated every 10 seconds, pass step=10
+    aggregator = Aggregator(print_window, window=60)
+    ruuvidaemon = RuuviDaemon(callback=aggregator)
+    ruuvidaemon.start()
+
+    try:
+        while True:
+            time.sleep(5.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ruuvidaemon.stop()
+        ruuvidaemon.join()
+        # Emit the windows still open
+        aggregator.flush()
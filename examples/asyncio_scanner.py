@@ -0,0 +1,18 @@
+import asyncio
+
+from ruuvitag import AsyncRuuviScanner
+
+
+async def main():
+    # Start the scanner, and stop it cleanly when leaving the block
+    async with AsyncRuuviScanner() as scanner:
+        # Measurements are yielded as they're received
+        async for measurement in scanner:
+            print(measurement)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
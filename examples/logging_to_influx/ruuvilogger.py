@@ -1,5 +1,5 @@
-from math import isnan
 from ruuvitag import RuuviDaemon
+from ruuvitag.influx import InfluxDBSink
 from influxdb import InfluxDBClient
 
 
@@ -7,6 +7,8 @@ class RuuviLogger(RuuviDaemon):
     def __init__(self, *args, **kwargs):
         super(RuuviLogger, self).__init__(*args, **kwargs)
         self.influx = InfluxDBClient(host="127.0.0.99", database="ruuvitag")
+        # Points are written in batches from a background thread
+        self.sink = InfluxDBSink(url="http://127.0.0.99:8086", database="ruuvitag")
 
         print(self.influx.get_list_database())
         if "ruuvitag" not in [x["name"] for x in self.influx.get_list_database()]:
@@ -44,37 +46,27 @@ class RuuviLogger(RuuviDaemon):
         # Create 'ruuvitag' database
         self.influx.create_database("ruuvitag")
 
-    def callback(self, tag, is_new=False):
-        tag_as_dict = tag.as_dict()
+    def run(self):
+        self.sink.start()
+        try:
+            super(RuuviLogger, self).run()
+        finally:
+            self.sink.stop()
 
-        measurement_tags = {
-            "address": tag_as_dict.pop("address"),
-            "protocol": str(tag_as_dict.pop("protocol")),
-            "movement_detected": "true" if tag.movement_detected.is_set() else "false",
-        }
+    def callback(self, tag, is_new=False):
+        movement_detected = tag.movement_detected.is_set()
         tag.movement_detected.clear()
 
-        self.influx.write_points(
-            [
-                {
-                    "measurement": "ruuvitag",
-                    "time": tag_as_dict.pop("last_seen").datetime,
-                    "fields": {
-                        key: value
-                        for key, value in tag_as_dict.items()
-                        # Filter out NaN -values, as InfluxDB doesn't like them
-                        if not isnan(value)
-                    },
-                }
-            ],
-            tags=measurement_tags,
+        self.sink.add(
+            tag, tags={"movement_detected": "true" if movement_detected else "false"}
         )
 
 
 if __name__ == "__main__":
     import time
 
-    ruuvilogger = RuuviLogger()
+    # Drop rebroadcasts of the same measurement, so each is written only once
+    ruuvilogger = RuuviLogger(deduplicate=True)
     ruuvilogger.start()
 
     while ruuvilogger.is_alive():
@@ -1,8 +1,14 @@
 from ruuvitag import RuuviDaemon
+from ruuvitag.motion import MotionTracker
 
 
 # Subclass the RuuviDaemon to provide additional functionalities
 class MotionDetector(RuuviDaemon):
+    def __init__(self, *args, **kwargs):
+        super(MotionDetector, self).__init__(*args, **kwargs)
+        # Detect movement from acceleration, for tags without movement_counter
+        self.motion_tracker = MotionTracker()
+
     # Override callback to provide the functionality
     def callback(self, tag, is_new=False):
         # If a new tag is found
@@ -11,9 +17,12 @@ class MotionDetector(RuuviDaemon):
             print("New tag detected!", tag)
             if tag.protocol < 5:
                 print(
-                    "... however, the RuuviTag needs to be updated to support "
-                    + "protocol version 5 to function as a motion detector"
+                    "... using acceleration to detect movement, update the RuuviTag "
+                    + "to protocol version 5 to use its movement counter"
                 )
+        # Older protocols don't report movement, so detect it in software
+        if tag.protocol < 5:
+            self.motion_tracker.update(tag)
         # If movement is detected
         if tag.movement_detected.is_set():
             # ... print event information
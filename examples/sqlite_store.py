@@ -0,0 +1,27 @@
+from ruuvitag import RuuviDaemon
+from ruuvitag.store import SQLiteStore
+
+if __name__ == "__main__":
+    import time
+
+    # Keep raw measurements for a week, and hourly rollups forever
+    store = SQLiteStore("ruuvitag.db", retention=7 * 24 * 3600)
+    store.start()
+    ruuvidaemon = RuuviDaemon(callback=store)
+    ruuvidaemon.start()
+
+    try:
+        while True:
+            time.sleep(60.0)
+            # Print the hourly mean temperatures of the last day
+            since = time.time_ns() - 24 * 3600 * 1000000000
+            for address in store.addresses():
+                hours = store.hourly(address, start_ns=since, fields=["temperature"])
+                print(address, hours["temperature_mean"].round(2))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ruuvidaemon.stop()
+        ruuvidaemon.join()
+        # Write the buffered measurements
+        store.stop()
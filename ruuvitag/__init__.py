@@ -1,2 +1,25 @@
-from .ruuvitag import RuuviTag
-from .ruuvidaemon import RuuviDaemon
+import importlib
+
+from .decoder import Measurement
+
+# Attributes imported on first access (PEP 562), so decoding doesn't
+# require bluepy, bitstring or arrow to be installed or imported.
+_LAZY_ATTRIBUTES = {
+    "RuuviTag": ".ruuvitag",
+    "RuuviDaemon": ".ruuvidaemon",
+    "AsyncRuuviScanner": ".asyncscanner",
+}
+
+__all__ = ["Measurement"] + sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
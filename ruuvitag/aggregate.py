@@ -0,0 +1,133 @@
+import threading
+from collections import deque, namedtuple
+from math import isnan
+
+from .decoder import FIELDS
+
+#: Statistics of a single field within a window.
+Summary = namedtuple("Summary", ["count", "mean", "min", "max", "last"])
+
+#: Summaries of a tag within a window, start and end are seconds since
+#: epoch, summaries maps field names to Summary.
+Window = namedtuple("Window", ["address", "start", "end", "summaries"])
+
+
+def _add(stats, value):
+    """Add a value to [count, sum, min, max, last] in place."""
+    if stats[0]:
+        stats[1] += value
+        stats[2] = min(stats[2], value)
+        stats[3] = max(stats[3], value)
+    else:
+        stats[1] = stats[2] = stats[3] = value
+    stats[0] += 1
+    stats[4] = value
+
+
+def _merge(stats, other):
+    """Merge other [count, sum, min, max, last] into stats in place,
+    other being more recent."""
+    if not other[0]:
+        return
+    if stats[0]:
+        stats[1] += other[1]
+        stats[2] = min(stats[2], other[2])
+        stats[3] = max(stats[3], other[3])
+    else:
+        stats[1:4] = other[1:4]
+    stats[0] += other[0]
+    stats[4] = other[4]
+
+
+class Aggregator(object):
+    """Streaming per-tag window aggregation, usable as the callback of
+    RuuviDaemon. Calls callback(window) with a Window for every closed
+    window of a tag.
+
+    Windows are aligned to multiples of step since epoch. Sliding windows
+    are made of window / step buckets, so memory per tag stays constant.
+    Windows close when a later measurement of the tag arrives, or on
+    flush().
+
+    Arguments:
+            callback: function to call with each Window.
+
+    Keyword arguments:
+            window (float): length of a window, in seconds. Defaults to 60.
+            step (float): interval between windows, in seconds.
+                window must be a multiple of step. Defaults to window,
+                i.e. tumbling windows.
+            fields (iterable): fields to aggregate. Defaults to FIELDS.
+    """
+
+    def __init__(self, callback, window=60.0, step=None, fields=FIELDS):
+        step = step or window
+        buckets = int(round(window / step))
+        if buckets < 1 or abs(buckets * step - window) > 1e-9 * window:
+            raise ValueError("window must be a multiple of step")
+
+        self.callback = callback
+        self.window = window
+        self.step = step
+        self.fields = tuple(fields)
+        self.buckets = buckets
+        self.__tags = {}
+        self.__lock = threading.Lock()
+
+    def __call__(self, tag, is_new=False):
+        """Add the tag, with the signature of a RuuviDaemon callback."""
+        self.add(tag)
+
+    def add(self, tag):
+        """Add the current values of a RuuviTag."""
+        values = tag.as_dict(timestamp=False)
+        index = int(tag.last_seen_ns / 1e9 // self.step)
+
+        with self.__lock:
+            buckets = self.__tags.get(tag.address)
+            if buckets is None:
+                buckets = self.__tags[tag.address] = deque(maxlen=self.buckets)
+            if not buckets or index > buckets[-1][0]:
+                self._close(tag.address, buckets, index)
+                buckets.append((index, [[0, 0, 0, 0, 0] for _ in self.fields]))
+
+            # Late measurements are counted in the latest bucket
+            for stats, field in zip(buckets[-1][1], self.fields):
+                value = values.get(field)
+                if value is not None and not isnan(value):
+                    _add(stats, value)
+
+    def flush(self):
+        """Emit the open windows of all tags and forget them."""
+        with self.__lock:
+            tags, self.__tags = self.__tags, {}
+        for address, buckets in tags.items():
+            self._close(address, buckets, buckets[-1][0] + self.buckets)
+
+    def _close(self, address, buckets, index):
+        """Emit windows ending before the bucket index, which contain
+        measurements."""
+        if not buckets:
+            return
+        latest = buckets[-1][0]
+        for end in range(latest + 1, min(index, latest + self.buckets) + 1):
+            merged = [[0, 0, 0, 0, 0] for _ in self.fields]
+            for bucket_index, bucket in buckets:
+                if bucket_index >= end - self.buckets:
+                    for stats, other in zip(merged, bucket):
+                        _merge(stats, other)
+
+            summaries = {
+                field: Summary(stats[0], stats[1] / stats[0], *stats[2:])
+                for field, stats in zip(self.fields, merged)
+                if stats[0]
+            }
+            if summaries:
+                self.callback(
+                    Window(
+                        address,
+                        (end - self.buckets) * self.step,
+                        end * self.step,
+                        summaries,
+                    )
+                )
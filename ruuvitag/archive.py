@@ -0,0 +1,329 @@
+import glob
+import os
+import threading
+from datetime import date, timedelta
+from time import time_ns
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .decoder import FIELDS
+from .writer import BackgroundWriter
+
+NS_PER_DAY = 86400 * 1000000000
+EPOCH_DATE = date(1970, 1, 1)
+
+#: Columns of the files of an archive. The address is stored in the
+#: partition directory, see ArchiveSink.
+FILE_SCHEMA = pa.schema(
+    [("timestamp", pa.timestamp("ns", tz="UTC")), ("protocol", pa.uint8())]
+    + [(field, pa.float64()) for field in FIELDS]
+)
+
+#: Columns of the tables returned by read_archive.
+SCHEMA = FILE_SCHEMA.insert(1, pa.field("address", pa.string()))
+
+#: File extension and default compression of each format.
+FORMATS = {"parquet": (".parquet", "zstd"), "arrow": (".arrow", None)}
+
+#: Extension of files still being written, Arrow IPC streams. Their names
+#: start with "_" and those of temporary files with ".", so readers of
+#: Parquet datasets skip them.
+PARTIAL = ".partial"
+
+
+def _date_directory(day):
+    """Returns the partition directory of a day since epoch."""
+    return "date=%s" % (EPOCH_DATE + timedelta(days=day)).isoformat()
+
+
+def _address_directory(address):
+    """Returns the partition directory of a MAC address."""
+    return "address=%s" % address.replace(":", "").lower()
+
+
+def _address(directory):
+    """Returns the MAC address of a partition directory name."""
+    value = directory.split("=", 1)[1]
+    return ":".join(value[i : i + 2] for i in range(0, 12, 2))
+
+
+def _read_partial(filename):
+    """Returns the complete record batches of a partial file as a Table.
+    The file may still be written to, or cut short by a crash."""
+    batches = []
+    with open(filename, "rb") as f:
+        data = f.read()
+    try:
+        reader = pa.ipc.open_stream(pa.py_buffer(data))
+        while True:
+            batches.append(reader.read_next_batch())
+    except StopIteration:
+        pass
+    except (ValueError, OSError):
+        # Incomplete message at the end
+        pass
+    return pa.Table.from_batches(batches, FILE_SCHEMA)
+
+
+class ArchiveSink(BackgroundWriter):
+    """Archives tags to columnar files in a background thread, usable as
+    the callback of RuuviDaemon. Requires pyarrow.
+
+    Measurements are buffered as columns, and appended on every flush to
+    a partial file per tag and day, in Hive style partition directories:
+    path/date=2024-01-31/address=f7bf87466fee/. A partial file is
+    compacted to a single Parquet or Arrow IPC file, named by its first
+    timestamp and time of creation, when the day is over, when it reaches
+    max_file_rows, or on stop(). Partial files left by a crash are
+    compacted on start().
+
+    Completed files are read as a dataset by pyarrow and other Parquet
+    readers, which skip the partial files, as their names start with "_".
+    read_archive also reads the flushed measurements of partial files. One
+    file per tag is kept open while running.
+
+    Arguments:
+            path (str): root directory of the archive, created if needed.
+
+    Keyword arguments:
+            format (str): "parquet", or "arrow" for uncompressed Arrow IPC
+                files, which read_archive maps without copying.
+                Defaults to "parquet".
+            compression (str): codec of Parquet files.
+                Defaults to "zstd".
+            batch_size (int): number of buffered measurements causing a
+                flush. Defaults to 10000.
+            flush_interval (float): maximum time between flushes,
+                in seconds. Defaults to 60.
+            max_file_rows (int): number of measurements after which a
+                file is completed. Defaults to 1000000.
+    """
+
+    def __init__(
+        self,
+        path,
+        format="parquet",
+        compression=None,
+        batch_size=10000,
+        flush_interval=60.0,
+        max_file_rows=1000000,
+    ):
+        if format not in FORMATS:
+            raise ValueError("format must be one of %s" % ", ".join(FORMATS))
+        super(ArchiveSink, self).__init__(batch_size, flush_interval, None)
+        self.path = path
+        self.format = format
+        self.extension, default_compression = FORMATS[format]
+        self.compression = compression or default_compression
+        self.max_file_rows = max_file_rows
+
+        #: int: measurements written
+        self.rows_written = 0
+        #: int: files completed
+        self.files_written = 0
+        #: int: size of the files completed, in bytes
+        self.bytes_written = 0
+
+        # Partial files by (address, day): [filename, file, writer, rows]
+        self.__partials = {}
+        self.__latest_day = None
+        self.__lock = threading.Lock()
+
+    def add(self, tag):
+        """Buffer the current values of a RuuviTag for writing."""
+        self._append(
+            (tag.address, tag.last_seen_ns, tag.protocol)
+            + tuple(getattr(tag, field) for field in FIELDS)
+        )
+
+    def start(self):
+        """Complete partial files left over from a previous run, and start
+        the background writer thread."""
+        with self.__lock:
+            directories = os.path.join(self.path, "date=*", "address=*")
+            for filename in glob.glob(os.path.join(directories, ".*.tmp")):
+                os.remove(filename)
+            for filename in glob.glob(os.path.join(directories, "_*" + PARTIAL)):
+                self._compact(filename)
+        super(ArchiveSink, self).start()
+
+    def stop(self, timeout=None):
+        """Stop the writer thread, flush the buffered measurements and
+        complete all partial files."""
+        super(ArchiveSink, self).stop(timeout)
+        self.flush()
+        with self.__lock:
+            for key in list(self.__partials):
+                self._complete(key)
+
+    def flush(self):
+        """Append the buffered measurements to the partial files, from the
+        calling thread."""
+        self._drain()
+
+    def _write(self, rows):
+        """Append rows to the partial files, and complete files of past
+        days or reaching max_file_rows."""
+        partitions = {}
+        for row in rows:
+            key = (row[0], row[1] // NS_PER_DAY)
+            partitions.setdefault(key, []).append(row[1:])
+
+        with self.__lock:
+            for key, rows in partitions.items():
+                partial = self.__partials.get(key)
+                if partial is None:
+                    partial = self.__partials[key] = self._open(key, rows[0][0])
+                batch = pa.RecordBatch.from_arrays(
+                    [
+                        pa.array(column, type=field.type)
+                        for column, field in zip(zip(*rows), FILE_SCHEMA)
+                    ],
+                    schema=FILE_SCHEMA,
+                )
+                partial[2].write_batch(batch)
+                partial[3] += batch.num_rows
+                self.rows_written += batch.num_rows
+                if partial[3] >= self.max_file_rows:
+                    self._complete(key)
+                if self.__latest_day is None or key[1] > self.__latest_day:
+                    self.__latest_day = key[1]
+
+            # Also completes the files of tags not heard from anymore
+            for key in list(self.__partials):
+                if key[1] < self.__latest_day:
+                    self._complete(key)
+
+    def _open(self, key, timestamp):
+        """Returns [filename, file, writer, rows] of a new partial file."""
+        address, day = key
+        directory = os.path.join(
+            self.path, _date_directory(day), _address_directory(address)
+        )
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, "_%i-%i%s" % (timestamp, time_ns(), PARTIAL))
+        sink = pa.OSFile(filename, "wb")
+        return [filename, sink, pa.ipc.new_stream(sink, FILE_SCHEMA), 0]
+
+    def _complete(self, key):
+        """Close the partial file of a tag and day, and compact it."""
+        filename, sink, writer, _ = self.__partials.pop(key)
+        writer.close()
+        sink.close()
+        self._compact(filename)
+
+    def _compact(self, filename):
+        """Rewrite a partial file as a completed file, and remove it."""
+        table = _read_partial(filename)
+        if table.num_rows:
+            # Name of the partial file, without prefix and extension, so
+            # read_archive skips the partial file while both exist
+            directory, name = os.path.split(filename)
+            completed = os.path.join(
+                directory, name[1 : -len(PARTIAL)] + self.extension
+            )
+            self._write_file(table, completed)
+            self.files_written += 1
+            self.bytes_written += os.path.getsize(completed)
+        os.remove(filename)
+
+    def _write_file(self, table, filename):
+        """Write a table to a file, atomically."""
+        directory, name = os.path.split(filename)
+        temporary = os.path.join(directory, ".%s.tmp" % name)
+        table = table.combine_chunks()
+        if self.format == "parquet":
+            pq.write_table(table, temporary, compression=self.compression)
+        else:
+            with pa.OSFile(temporary, "wb") as sink:
+                with pa.ipc.new_file(sink, FILE_SCHEMA) as writer:
+                    writer.write_table(table)
+        os.replace(temporary, filename)
+
+
+def read_archive(path, start_ns=None, end_ns=None, addresses=None, columns=None):
+    """Read measurements of an archive written by ArchiveSink. Only the
+    partitions of the requested days and tags are opened, files are
+    memory-mapped.
+
+    Arguments:
+        path (str): root directory of the archive.
+
+    Keyword arguments:
+        start_ns (int): earliest time to read, in nanoseconds since epoch.
+            Defaults to None, from the beginning.
+        end_ns (int): time to read until (exclusive), in nanoseconds since
+            epoch. Defaults to None, until the end.
+        addresses (iterable): MAC addresses of tags to read.
+            Defaults to None, all tags.
+        columns (iterable): names of the columns to read besides timestamp
+            and address. Defaults to None, all columns.
+
+    Returns a pyarrow Table of SCHEMA, or of the selected columns, ordered
+    by tag and time. Includes flushed measurements of partial files.
+    Convert columns to NumPy arrays with table["temperature"].to_numpy().
+    """
+    if addresses is not None:
+        addresses = {address.lower() for address in addresses}
+    names = FILE_SCHEMA.names
+    if columns is not None:
+        names = ["timestamp"] + [name for name in columns if name != "timestamp"]
+    # Directory names of dates sort in time order
+    first = None if start_ns is None else _date_directory(start_ns // NS_PER_DAY)
+    last = None if end_ns is None else _date_directory((end_ns - 1) // NS_PER_DAY)
+
+    tables = []
+    for day in sorted(os.listdir(path)) if os.path.isdir(path) else ():
+        if not day.startswith("date="):
+            continue
+        if (first and day < first) or (last and day > last):
+            continue
+        for directory in sorted(os.listdir(os.path.join(path, day))):
+            address = _address(directory)
+            if addresses is not None and address not in addresses:
+                continue
+            directory = os.path.join(path, day, directory)
+            filenames = sorted(os.listdir(directory))
+            for filename in filenames:
+                if filename.startswith("_") and filename.endswith(PARTIAL):
+                    stem = filename[1 : -len(PARTIAL)]
+                    if stem + ".parquet" in filenames or stem + ".arrow" in filenames:
+                        # Being compacted
+                        continue
+                elif filename.startswith(("_", ".")):
+                    # Temporary and hidden files
+                    continue
+                filename = os.path.join(directory, filename)
+                if filename.endswith(".parquet"):
+                    table = pq.read_table(filename, columns=names, memory_map=True)
+                elif filename.endswith(".arrow"):
+                    table = pa.ipc.open_file(pa.memory_map(filename)).read_all()
+                    table = table.select(names)
+                elif filename.endswith(PARTIAL):
+                    table = _read_partial(filename).select(names)
+                else:
+                    continue
+                tables.append(
+                    table.add_column(
+                        1, "address", pa.array([address] * len(table), pa.string())
+                    )
+                )
+
+    schema = pa.schema(
+        [field for field in SCHEMA if field.name in names or field.name == "address"]
+    )
+    if not tables:
+        return schema.empty_table()
+    table = pa.concat_tables(tables).select(schema.names)
+    timestamps = table["timestamp"]
+    mask = None
+    if start_ns is not None:
+        mask = pc.greater_equal(timestamps, pa.scalar(start_ns, timestamps.type))
+    if end_ns is not None:
+        before = pc.less(timestamps, pa.scalar(end_ns, timestamps.type))
+        mask = before if mask is None else pc.and_(mask, before)
+    if mask is not None:
+        table = table.filter(mask)
+    return table.sort_by([("address", "ascending"), ("timestamp", "ascending")])
@@ -0,0 +1,111 @@
+import asyncio
+
+from .backends import BluepyBackend
+from .decoder import decode
+
+
+class AsyncRuuviScanner(object):
+    """An asyncio scanner for RuuviTags.
+
+    Reception runs in an executor, so it's never blocked by the event loop.
+    Decoded Measurements are published to every subscribed queue.
+
+        async with AsyncRuuviScanner() as scanner:
+            async for measurement in scanner:
+                print(measurement)
+
+    Keyword arguments:
+            interface_index (int): the index of bluetooth device to use.
+                Defaults to 0.
+            backend (Backend): source of advertisements, see
+                ruuvitag.backends. Defaults to BluepyBackend.
+    """
+
+    def __init__(self, interface_index=0, backend=None):
+        self.backend = backend or BluepyBackend(interface_index)
+        self.subscribers = set()
+        #: int: measurements dropped, as a subscriber queue was full
+        self.dropped = 0
+        self.__loop = None
+        self.__future = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.stop()
+
+    async def __aiter__(self):
+        """Yields Measurements as they're received, until the scanner is
+        stopped. Starts the scanner, if not already running."""
+        queue = self.subscribe()
+        try:
+            await self.start()
+            while True:
+                measurement = await queue.get()
+                if measurement is None:
+                    return
+                yield measurement
+        finally:
+            self.unsubscribe(queue)
+
+    async def start(self):
+        """Start receiving advertisements in an executor."""
+        if self.__future is not None:
+            return
+        self.__loop = asyncio.get_running_loop()
+        # Before stop() can run, as Backend.start() clears a stop request
+        self.backend.start()
+        self.__future = self.__loop.run_in_executor(None, self._receive)
+
+    async def stop(self):
+        """Stop receiving and wait for the executor to finish. Subscribers
+        receive None to signify the end of measurements."""
+        if self.__future is None:
+            return
+        self.backend.stop()
+        try:
+            await self.__future
+        finally:
+            self.__future = None
+
+    def subscribe(self, maxsize=0):
+        """Returns an asyncio.Queue receiving all Measurements.
+        None is put to the queue when the scanner stops.
+
+        Keyword arguments:
+                maxsize (int): size of the queue, when full the newest
+                    measurements are dropped. Defaults to 0 (unbounded).
+        """
+        queue = asyncio.Queue(maxsize)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        """Stop publishing Measurements to a queue from subscribe()."""
+        self.subscribers.discard(queue)
+
+    def _receive(self):
+        """Blocking reception loop, run in an executor."""
+        try:
+            for advertisement in self.backend:
+                try:
+                    measurement = decode(advertisement.addr, advertisement.rawData)
+                except Exception:
+                    continue
+                if measurement:
+                    self.__loop.call_soon_threadsafe(self._publish, measurement)
+        finally:
+            self.__loop.call_soon_threadsafe(self._publish, None)
+
+    def _publish(self, measurement):
+        """Put a measurement to all subscribers, run in the event loop."""
+        for queue in tuple(self.subscribers):
+            if measurement is None and queue.full():
+                # Make room for the end marker, so no subscriber hangs
+                queue.get_nowait()
+            try:
+                queue.put_nowait(measurement)
+            except asyncio.QueueFull:
+                self.dropped += 1
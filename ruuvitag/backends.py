@@ -0,0 +1,267 @@
+import os
+import selectors
+import socket
+import struct
+import threading
+from collections import deque, namedtuple
+
+#: A single received advertisement. Attribute names follow bluepy's
+#: ScanEntry, so either can be passed to RuuviDaemon.update_tag.
+Advertisement = namedtuple("Advertisement", ["addr", "rssi", "rawData"])
+
+
+class Backend(object):
+    """Base class for sources of raw advertisements.
+
+    A backend is started with start() and then iterated, from the same
+    thread, for Advertisements. Iteration ends when stop() has been called
+    (from any thread) or the source is exhausted.
+
+    Backends reading a file descriptor wait for it with _readable(), so an
+    idle backend sleeps until data arrives and stops without delay.
+    """
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self.__wakeup_lock = threading.Lock()
+        self.__wakeup = None
+        #: int: number of times _readable() woke up to read
+        self.wakeups = 0
+
+    def start(self):
+        """Start receiving advertisements."""
+        self._stop.clear()
+
+    def stop(self):
+        """Request iteration to end, safe to call from any thread."""
+        self._stop.set()
+        with self.__wakeup_lock:
+            if self.__wakeup is not None:
+                try:
+                    os.write(self.__wakeup, b"\x00")
+                except BlockingIOError:
+                    # A wakeup is pending already
+                    pass
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def _readable(self, fileobj, timeout=None):
+        """Yields whenever fileobj is readable, until stop() is called.
+        Blocks in a selector in between, which stop() wakes up through a
+        self-pipe.
+
+        Keyword arguments:
+            timeout (float): maximum time to block, in seconds, after which
+                it yields also if fileobj isn't readable. Defaults to None,
+                no timeout.
+        """
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(write_fd, False)
+        selector = selectors.DefaultSelector()
+        try:
+            selector.register(read_fd, selectors.EVENT_READ)
+            selector.register(fileobj, selectors.EVENT_READ)
+            with self.__wakeup_lock:
+                self.__wakeup = write_fd
+            while not self._stop.is_set():
+                events = selector.select(timeout)
+                if any(key.fd == read_fd for key, _ in events):
+                    return
+                self.wakeups += 1
+                yield
+        finally:
+            with self.__wakeup_lock:
+                self.__wakeup = None
+            selector.close()
+            os.close(read_fd)
+            os.close(write_fd)
+
+
+class BluepyBackend(Backend):
+    """Receives advertisements using bluepy.
+
+    The output of bluepy-helper is a buffered text stream: lines already
+    read into its buffer don't make the pipe readable. bluepy's own
+    process() has the same limit, as it polls the pipe before each line, so
+    such lines are read on the next advertisement, or after poll_interval
+    at the latest.
+
+    Keyword arguments:
+            interface_index (int): the index of bluetooth device to use.
+                Defaults to 0.
+            timeout (float): how long to keep reading from bluepy-helper
+                after it became readable, in seconds. Defaults to 0.01.
+            poll_interval (float): maximum time between reads, in seconds.
+                Defaults to 1.0.
+    """
+
+    def __init__(self, interface_index=0, timeout=0.01, poll_interval=1.0):
+        super(BluepyBackend, self).__init__()
+        self.interface_index = interface_index
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.__scanner = None
+        self.__received = deque()
+
+    def handleDiscovery(self, device, is_new_device, is_new_data):
+        """Called by bluepy for each received advertisement."""
+        self.__received.append(Advertisement(device.addr, device.rssi, device.rawData))
+
+    def start(self):
+        from bluepy import btle
+
+        super(BluepyBackend, self).start()
+        self.__scanner = btle.Scanner(self.interface_index).withDelegate(self)
+        self.__scanner.start(passive=True)
+
+    def __iter__(self):
+        try:
+            # Sleep on the output of bluepy-helper, instead of polling it
+            for _ in self._readable(
+                self.__scanner._helper.stdout, timeout=self.poll_interval
+            ):
+                self.__scanner.process(timeout=self.timeout)
+                while self.__received:
+                    yield self.__received.popleft()
+        finally:
+            self.__scanner.stop()
+
+
+# Linux HCI constants, see lib/hci.h of BlueZ
+SOL_HCI = getattr(socket, "SOL_HCI", 0)
+HCI_FILTER = getattr(socket, "HCI_FILTER", 2)
+HCI_COMMAND_PKT = 0x01
+HCI_EVENT_PKT = 0x04
+EVT_LE_META_EVENT = 0x3E
+EVT_LE_ADVERTISING_REPORT = 0x02
+LE_SET_SCAN_PARAMETERS = 0x08 << 10 | 0x000B
+LE_SET_SCAN_ENABLE = 0x08 << 10 | 0x000C
+
+
+def parse_hci_event(packet):
+    """Returns the Advertisements of an LE Advertising Report event read
+    from a raw HCI socket, or an empty list for other packets."""
+    if (
+        len(packet) < 5
+        or packet[0] != HCI_EVENT_PKT
+        or packet[1] != EVT_LE_META_EVENT
+        or packet[3] != EVT_LE_ADVERTISING_REPORT
+    ):
+        return []
+
+    advertisements = []
+    offset = 5
+    # Reports are laid out one after another, as by BlueZ and controllers
+    # in practice, which send a single report per event
+    for _ in range(packet[4]):
+        if offset + 9 > len(packet):
+            break
+        length = packet[offset + 8]
+        end = offset + 9 + length
+        if end >= len(packet):
+            break
+        address = "%02x:%02x:%02x:%02x:%02x:%02x" % tuple(
+            packet[offset + 7 : offset + 1 : -1]
+        )
+        rssi = packet[end] - 256 if packet[end] > 127 else packet[end]
+        advertisements.append(
+            Advertisement(address, rssi, bytes(packet[offset + 9 : end]))
+        )
+        offset = end + 1
+    return advertisements
+
+
+class HCIBackend(Backend):
+    """Receives advertisements from a raw HCI socket, without bluepy or
+    its helper process. Requires Linux, and root or the CAP_NET_RAW and
+    CAP_NET_ADMIN capabilities.
+
+    Scanning is passive. Extended advertising reports of Bluetooth 5 are
+    not handled, RuuviTags send legacy advertisements.
+
+    Keyword arguments:
+            interface_index (int): the index of bluetooth device to use,
+                i.e. 0 for hci0. Defaults to 0.
+    """
+
+    def __init__(self, interface_index=0):
+        super(HCIBackend, self).__init__()
+        self.interface_index = interface_index
+        self.__socket = None
+
+    def _command(self, opcode, parameters):
+        """Send an HCI command."""
+        self.__socket.send(
+            struct.pack("<BHB", HCI_COMMAND_PKT, opcode, len(parameters)) + parameters
+        )
+
+    def start(self):
+        super(HCIBackend, self).start()
+        sock = socket.socket(socket.AF_BLUETOOTH, socket.SOCK_RAW, socket.BTPROTO_HCI)
+        try:
+            sock.bind((self.interface_index,))
+            # Only receive LE meta events
+            sock.setsockopt(
+                SOL_HCI,
+                HCI_FILTER,
+                struct.pack(
+                    "<IIIH", 1 << HCI_EVENT_PKT, 0, 1 << (EVT_LE_META_EVENT - 32), 0
+                ),
+            )
+            sock.setblocking(False)
+        except Exception:
+            sock.close()
+            raise
+        self.__socket = sock
+        # Passive scan with 10 ms interval and window, without duplicate
+        # filtering of the controller
+        self._command(LE_SET_SCAN_ENABLE, b"\x00\x00")
+        self._command(LE_SET_SCAN_PARAMETERS, struct.pack("<BHHBB", 0, 16, 16, 0, 0))
+        self._command(LE_SET_SCAN_ENABLE, b"\x01\x00")
+
+    def __iter__(self):
+        sock = self.__socket
+        try:
+            for _ in self._readable(sock):
+                # Read everything queued, before sleeping again
+                while True:
+                    try:
+                        packet = sock.recv(260)
+                    except BlockingIOError:
+                        break
+                    for advertisement in parse_hci_event(packet):
+                        yield advertisement
+        finally:
+            try:
+                self._command(LE_SET_SCAN_ENABLE, b"\x00\x00")
+            except OSError:
+                pass
+            sock.close()
+            self.__socket = None
+
+
+class FakeBackend(Backend):
+    """Yields advertisements from memory, used for testing.
+
+    Arguments:
+            advertisements (iterable): Advertisements, or
+                (addr, rssi, rawData) tuples, to yield.
+
+    Keyword arguments:
+            interval (float): delay before each advertisement, in seconds.
+                Defaults to 0.
+    """
+
+    def __init__(self, advertisements, interval=0):
+        super(FakeBackend, self).__init__()
+        self.advertisements = advertisements
+        self.interval = interval
+
+    def __iter__(self):
+        for advertisement in self.advertisements:
+            if self.interval:
+                self._stop.wait(self.interval)
+            if self._stop.is_set():
+                return
+            yield Advertisement._make(advertisement)
@@ -0,0 +1,224 @@
+import numpy as np
+
+from .decoder import FORMAT_3, FORMAT_5
+
+# Big-endian views of the payloads following the format byte, see
+# FORMAT_3 and FORMAT_5 in ruuvitag.decoder.
+FORMAT_3_DTYPE = np.dtype(
+    [
+        ("humidity", "u1"),
+        ("temperature", "u1"),
+        ("temperature_fraction", "u1"),
+        ("pressure", ">u2"),
+        ("acceleration_x", ">i2"),
+        ("acceleration_y", ">i2"),
+        ("acceleration_z", ">i2"),
+        ("battery_voltage", ">u2"),
+    ]
+)
+FORMAT_5_DTYPE = np.dtype(
+    [
+        ("temperature", ">i2"),
+        ("humidity", ">u2"),
+        ("pressure", ">u2"),
+        ("acceleration_x", ">i2"),
+        ("acceleration_y", ">i2"),
+        ("acceleration_z", ">i2"),
+        ("power_info", ">u2"),
+        ("movement_counter", "u1"),
+        ("measurement_sequence", ">u2"),
+        ("mac", "u1", (6,)),
+    ]
+)
+assert FORMAT_3_DTYPE.itemsize == FORMAT_3.size
+assert FORMAT_5_DTYPE.itemsize == FORMAT_5.size
+
+#: Fields of the array returned by parse_many, protocol is 0 for rows
+#: that didn't contain a (complete) Ruuvi payload.
+MEASUREMENT_DTYPE = np.dtype(
+    [
+        ("address", "U17"),
+        ("protocol", "u1"),
+        ("temperature", "f8"),
+        ("humidity", "f8"),
+        ("pressure", "f8"),
+        ("acceleration_x", "f8"),
+        ("acceleration_y", "f8"),
+        ("acceleration_z", "f8"),
+        ("battery_voltage", "f8"),
+        ("tx_power", "f8"),
+        ("movement_counter", "f8"),
+        ("measurement_sequence", "f8"),
+    ]
+)
+
+
+def as_matrix(payloads, width=None, out=None):
+    """Returns payloads as a zero-padded 2D uint8 array and their lengths.
+
+    Arguments:
+        payloads (sequence of bytes or 2D uint8 array): received data.
+
+    Keyword arguments:
+        width (int): width of the array, longer payloads are truncated.
+            Defaults to the length of the longest payload, or the width
+            of out.
+        out (2D uint8 array): array to write the payloads to, such as
+            shared memory, with at least a row per payload. The returned
+            matrix is a view of its first rows. Defaults to a new array.
+    """
+    if out is not None:
+        width = out.shape[1] if width is None else min(width, out.shape[1])
+    if isinstance(payloads, np.ndarray) and payloads.ndim == 2:
+        matrix = np.ascontiguousarray(payloads[:, :width], dtype=np.uint8)
+        lengths = np.full(matrix.shape[0], matrix.shape[1], dtype=np.intp)
+    else:
+        payloads = [bytes(payload or b"") for payload in payloads]
+        lengths = np.fromiter(map(len, payloads), dtype=np.intp, count=len(payloads))
+        if width is None:
+            width = int(lengths.max()) if len(payloads) else 0
+        else:
+            payloads = [payload[:width] for payload in payloads]
+            np.minimum(lengths, width, out=lengths)
+        matrix = np.frombuffer(
+            b"".join(payload.ljust(width, b"\x00") for payload in payloads),
+            dtype=np.uint8,
+        ).reshape(len(payloads), width)
+
+    if out is None:
+        return matrix, lengths
+    out = out[: matrix.shape[0]]
+    out[:, : matrix.shape[1]] = matrix
+    out[:, matrix.shape[1] :] = 0
+    return out, lengths
+
+
+def _find(matrix, data_format):
+    """Returns (found, offset) of the first Ruuvi header of data_format
+    in each row, offset pointing to the first byte after the header."""
+    windows = matrix.shape[1] - 3
+    if windows <= 0:
+        return (
+            np.zeros(matrix.shape[0], dtype=bool),
+            np.zeros(matrix.shape[0], dtype=np.intp),
+        )
+
+    match = (
+        (matrix[:, :windows] == 0xFF)
+        & (matrix[:, 1 : windows + 1] == 0x99)
+        & (matrix[:, 2 : windows + 2] == 0x04)
+        & (matrix[:, 3 : windows + 3] == data_format)
+    )
+    return match.any(axis=1), match.argmax(axis=1) + 4
+
+
+def _gather(matrix, rows, offsets, dtype):
+    """Copies the payloads of given rows into a structured array."""
+    columns = offsets[rows, None] + np.arange(dtype.itemsize)
+    raw = np.ascontiguousarray(matrix[rows[:, None], columns])
+    return raw.view(dtype).reshape(-1)
+
+
+def _valid(values, invalid, scaled):
+    """Replaces scaled values with NaN, where raw value is the invalid
+    sentinel of the specification."""
+    return np.where(values == invalid, np.nan, scaled)
+
+
+def parse_many(addresses, payloads):
+    """Parse a batch of data received from RuuviTags in one vectorized pass.
+    Supports versions 3 and 5 of the protocol, using the same rules as
+    RuuviTag.parse.
+
+    Arguments:
+        addresses (sequence of str): MAC addresses of RuuviTags.
+        payloads (sequence of bytes or 2D uint8 array): received data,
+            one advertisement per row.
+
+    Returns a structured array of MEASUREMENT_DTYPE, one row per payload.
+    Rows without a complete Ruuvi payload have protocol 0. Values not
+    available in the data format, or marked invalid by the specification
+    (format 5), are NaN.
+    """
+    matrix, lengths = as_matrix(payloads)
+    result = np.zeros(matrix.shape[0], dtype=MEASUREMENT_DTYPE)
+    result["address"] = addresses
+    return parse_matrix(matrix, lengths, result)
+
+
+def parse_matrix(matrix, lengths, out=None):
+    """Parse payloads packed with as_matrix, see parse_many.
+
+    Arguments:
+        matrix (2D uint8 array): zero-padded payloads, one per row.
+        lengths (1D array): actual length of each payload.
+
+    Keyword arguments:
+        out (array of MEASUREMENT_DTYPE): array to write the results to,
+            address is left untouched. Defaults to a new array.
+    """
+    result = out
+    if result is None:
+        result = np.zeros(matrix.shape[0], dtype=MEASUREMENT_DTYPE)
+    result["protocol"] = 0
+    for name in MEASUREMENT_DTYPE.names[2:]:
+        result[name] = np.nan
+
+    # Format 3 takes precedence, as in RuuviTag.parse
+    found_3, offsets_3 = _find(matrix, 0x03)
+    found_5, offsets_5 = _find(matrix, 0x05)
+    found_5 &= ~found_3
+
+    # https://github.com/ruuvi/ruuvi-sensor-protocols#data-format-3-protocol-specification
+    rows = np.flatnonzero(found_3 & (offsets_3 + FORMAT_3.size <= lengths))
+    if rows.size:
+        raw = _gather(matrix, rows, offsets_3, FORMAT_3_DTYPE)
+        temperature = raw["temperature"]
+        result["protocol"][rows] = 3
+        result["temperature"][rows] = np.where(temperature & 0x80, -1.0, 1.0) * (
+            (temperature & 0x7F).astype(np.float64)
+            + raw["temperature_fraction"] / 100.0
+        )
+        result["humidity"][rows] = raw["humidity"] / 2.0
+        result["pressure"][rows] = (raw["pressure"].astype(np.float64) + 50000) / 100.0
+        result["acceleration_x"][rows] = raw["acceleration_x"] / 1000.0
+        result["acceleration_y"][rows] = raw["acceleration_y"] / 1000.0
+        result["acceleration_z"][rows] = raw["acceleration_z"] / 1000.0
+        result["battery_voltage"][rows] = raw["battery_voltage"] / 1000.0
+
+    # https://github.com/ruuvi/ruuvi-sensor-protocols#data-format-5-protocol-specification
+    rows = np.flatnonzero(found_5 & (offsets_5 + FORMAT_5.size <= lengths))
+    if rows.size:
+        raw = _gather(matrix, rows, offsets_5, FORMAT_5_DTYPE)
+        battery_voltage = raw["power_info"] >> 5
+        tx_power = raw["power_info"] & 0x1F
+        result["protocol"][rows] = 5
+        result["temperature"][rows] = _valid(
+            raw["temperature"], -32768, raw["temperature"].astype(np.float64) * 0.005
+        )
+        result["humidity"][rows] = _valid(
+            raw["humidity"], 65535, raw["humidity"] * 0.0025
+        )
+        result["pressure"][rows] = _valid(
+            raw["pressure"],
+            65535,
+            (raw["pressure"].astype(np.float64) + 50000) / 100.0,
+        )
+        for axis in ("acceleration_x", "acceleration_y", "acceleration_z"):
+            result[axis][rows] = _valid(raw[axis], -32768, raw[axis] / 1000.0)
+        result["battery_voltage"][rows] = _valid(
+            battery_voltage,
+            2047,
+            (battery_voltage.astype(np.float64) + 1600) / 1000.0,
+        )
+        result["tx_power"][rows] = _valid(
+            tx_power, 31, tx_power.astype(np.float64) - 40
+        )
+        result["movement_counter"][rows] = _valid(
+            raw["movement_counter"], 255, raw["movement_counter"]
+        )
+        result["measurement_sequence"][rows] = _valid(
+            raw["measurement_sequence"], 65535, raw["measurement_sequence"]
+        )
+
+    return result
@@ -0,0 +1,155 @@
+import mmap
+import struct
+import threading
+import time
+
+from .backends import Advertisement, Backend
+
+#: File header: magic and format version.
+MAGIC = b"RUUVICAP"
+VERSION = 1
+HEADER = struct.Struct(">8sB")
+
+#: Record header, followed by the raw payload: timestamp in nanoseconds
+#: since epoch, address, rssi and length of the payload.
+RECORD = struct.Struct(">Q6sbB")
+
+
+def _pack_address(address):
+    """Returns "aa:bb:cc:dd:ee:ff" as 6 bytes."""
+    return bytes.fromhex(address.replace(":", ""))
+
+
+def _unpack_address(address):
+    """Returns 6 bytes as "aa:bb:cc:dd:ee:ff"."""
+    return ":".join("%02x" % byte for byte in bytearray(address))
+
+
+class CaptureWriter(object):
+    """Writes received advertisements to a capture file, usable as the
+    recorder of RuuviDaemon.
+
+    Arguments:
+            path (str): path of the capture file, appended to if it exists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__file = open(path, "ab")
+        self.__lock = threading.Lock()
+        #: int: number of records written
+        self.records = 0
+        if self.__file.tell() == 0:
+            self.__file.write(HEADER.pack(MAGIC, VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def write(self, device, timestamp=None):
+        """Write an advertisement to the capture.
+
+        Arguments:
+            device: the received advertisement, with addr, rssi and rawData
+                attributes, such as bluepy's ScanEntry.
+
+        Keyword arguments:
+            timestamp (int): time of reception, in nanoseconds since epoch.
+                Defaults to now.
+        """
+        data = device.rawData or b""
+        record = RECORD.pack(
+            timestamp if timestamp is not None else time.time_ns(),
+            _pack_address(device.addr),
+            max(-128, min(127, device.rssi or 0)),
+            len(data),
+        )
+        with self.__lock:
+            self.__file.write(record + data)
+            self.records += 1
+
+    def flush(self):
+        """Flush the written records to disk."""
+        with self.__lock:
+            self.__file.flush()
+
+    def close(self):
+        """Close the capture file."""
+        with self.__lock:
+            self.__file.close()
+
+
+def read_capture(path):
+    """Yields (timestamp, Advertisement) tuples from a capture file.
+    The file is memory-mapped, so captures of any size can be streamed.
+
+    Arguments:
+        path (str): path of the capture file.
+    """
+    with open(path, "rb") as capture:
+        with mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("%s is not a RuuviTag capture file" % path)
+
+            offset = HEADER.size
+            end = len(data) - RECORD.size
+            while offset <= end:
+                timestamp, address, rssi, length = RECORD.unpack_from(data, offset)
+                offset += RECORD.size
+                yield timestamp, Advertisement(
+                    _unpack_address(address), rssi, data[offset : offset + length]
+                )
+                offset += length
+
+
+class ReplayBackend(Backend):
+    """Yields advertisements from a capture file.
+
+    Arguments:
+            path (str): path of the capture file.
+
+    Keyword arguments:
+            speed (float): replay speed relative to the capture, 1.0 being
+                real-time. None replays as fast as possible.
+                Defaults to None.
+    """
+
+    def __init__(self, path, speed=None):
+        super(ReplayBackend, self).__init__()
+        self.path = path
+        self.speed = speed
+
+    def __iter__(self):
+        started = first = None
+        for timestamp, advertisement in read_capture(self.path):
+            if self._stop.is_set():
+                return
+            if self.speed:
+                if first is None:
+                    started, first = time.time(), timestamp
+                delay = started + (timestamp - first) / 1e9 / self.speed - time.time()
+                if delay > 0 and self._stop.wait(delay):
+                    return
+            yield advertisement
+
+
+def replay(daemon, path, speed=None):
+    """Feed a capture file through RuuviDaemon.update_tag in the calling
+    thread. Returns the number of replayed advertisements.
+
+    Arguments:
+        daemon (RuuviDaemon): the daemon to update, doesn't need to be
+            started.
+        path (str): path of the capture file.
+
+    Keyword arguments:
+        speed (float): see ReplayBackend. Defaults to None.
+    """
+    count = 0
+    for advertisement in ReplayBackend(path, speed=speed):
+        daemon.update_tag(advertisement)
+        count += 1
+    return count
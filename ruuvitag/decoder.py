@@ -0,0 +1,133 @@
+import struct
+from collections import namedtuple
+
+#: Manufacturer specific data (0xFF) for Ruuvi Innovations (0x0499,
+#: little-endian on air), followed by the data format byte.
+RUUVI_MANUFACTURER_DATA = b"\xff\x99\x04"
+FORMAT_3_HEADER = RUUVI_MANUFACTURER_DATA + b"\x03"
+FORMAT_5_HEADER = RUUVI_MANUFACTURER_DATA + b"\x05"
+
+# https://github.com/ruuvi/ruuvi-sensor-protocols#data-format-3-protocol-specification
+# humidity, temperature (sign + integer), temperature fraction, pressure,
+# acceleration x, y, z and battery voltage.
+FORMAT_3 = struct.Struct(">BBBHhhhH")
+
+# https://github.com/ruuvi/ruuvi-sensor-protocols#data-format-5-protocol-specification
+# temperature, humidity, pressure, acceleration x, y, z, power info
+# (11 bits battery voltage, 5 bits tx power), movement counter,
+# measurement sequence and MAC address (ignored).
+FORMAT_5 = struct.Struct(">hHHhhhHBH6x")
+
+NAN = float("nan")
+
+#: A single decoded advertisement. Fields are in the order of RuuviTag's
+#: positional arguments, so RuuviTag(*measurement) creates a tag from it.
+Measurement = namedtuple(
+    "Measurement",
+    [
+        "address",
+        "protocol",
+        "temperature",
+        "humidity",
+        "pressure",
+        "acceleration_x",
+        "acceleration_y",
+        "acceleration_z",
+        "battery_voltage",
+        "tx_power",
+        "movement_counter",
+        "measurement_sequence",
+    ],
+)
+
+#: Numeric fields of a Measurement, and of RuuviTag.as_dict(), stored and
+#: aggregated by default.
+FIELDS = Measurement._fields[2:]
+
+
+def decode_format_3(address, data, offset):
+    """Decode a format 3 payload starting at offset (after the header)
+    into a Measurement."""
+    (
+        humidity,
+        temperature,
+        temperature_fraction,
+        pressure,
+        accel_x,
+        accel_y,
+        accel_z,
+        battery_voltage,
+    ) = FORMAT_3.unpack_from(data, offset)
+
+    temperature_sign = -1 if temperature & 0x80 else 1
+
+    return Measurement(
+        address,
+        3,
+        temperature_sign * (float(temperature & 0x7F) + temperature_fraction / 100.0),
+        humidity / 2.0,
+        (pressure + 50000) / 100.0,
+        accel_x / 1000.0,
+        accel_y / 1000.0,
+        accel_z / 1000.0,
+        battery_voltage / 1000.0,
+        NAN,
+        0,
+        0,
+    )
+
+
+def decode_format_5(address, data, offset):
+    """Decode a format 5 payload starting at offset (after the header)
+    into a Measurement."""
+    (
+        temperature,
+        humidity,
+        pressure,
+        accel_x,
+        accel_y,
+        accel_z,
+        power_info,
+        movement_counter,
+        measurement_sequence,
+    ) = FORMAT_5.unpack_from(data, offset)
+
+    return Measurement(
+        address,
+        5,
+        float(temperature) * 0.005,
+        humidity * 0.0025,
+        (pressure + 50000) / 100.0,
+        accel_x / 1000.0,
+        accel_y / 1000.0,
+        accel_z / 1000.0,
+        ((power_info >> 5) + 1600) / 1000.0,
+        -40 + (power_info & 0x1F),
+        movement_counter,
+        measurement_sequence,
+    )
+
+
+def decode(address, data):
+    """Decode raw advertisement data received from a RuuviTag.
+    Currently supports versions 3 and 5 of the protocol.
+
+    Arguments:
+        address (str): MAC address of RuuviTag.
+        data (bytes): received data in bytes.
+
+    Returns a Measurement, or None if the data doesn't contain a supported
+    Ruuvi payload. Raises struct.error if the payload is truncated.
+    """
+    if not data:
+        return None
+
+    index = data.find(FORMAT_3_HEADER)
+    if index >= 0:
+        return decode_format_3(address, data, index + 4)
+
+    index = data.find(FORMAT_5_HEADER)
+    if index >= 0:
+        return decode_format_5(address, data, index + 4)
+
+    return None
@@ -0,0 +1,122 @@
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+#: When the queue is full, drop the oldest queued tag.
+DROP_OLDEST = "drop-oldest"
+#: When the queue is full, drop the tag being submitted.
+DROP_NEWEST = "drop-newest"
+#: Queue each tag only once, a tag already waiting in the queue is
+#: replaced with the latest submitted one. When the queue is full, drop
+#: the oldest.
+COALESCE = "coalesce"
+
+
+class Dispatcher(object):
+    """Calls a function for submitted tags from a pool of worker threads,
+    so a slow function doesn't block the submitting (scanner) thread.
+
+    Tags are queued as submitted, so submit snapshots (RuuviTag.copy())
+    of tags that keep being updated, such as those of RuuviDaemon.
+
+    Arguments:
+            function: function to call, with signature
+                function(tag, is_new: False)
+
+    Keyword arguments:
+            workers (int): number of worker threads. Defaults to 1.
+            maxsize (int): maximum number of queued tags. Defaults to 1000.
+            overflow (str): what to do when the queue is full or a tag is
+                already queued; DROP_OLDEST, DROP_NEWEST or COALESCE.
+                Defaults to DROP_OLDEST.
+    """
+
+    def __init__(self, function, workers=1, maxsize=1000, overflow=DROP_OLDEST):
+        if overflow not in (DROP_OLDEST, DROP_NEWEST, COALESCE):
+            raise ValueError("Unknown overflow policy %r" % overflow)
+
+        self.function = function
+        self.workers = workers
+        self.maxsize = maxsize
+        self.overflow = overflow
+
+        #: int: tags dropped, as the queue was full
+        self.dropped = 0
+        #: int: submissions merged into a tag already in the queue
+        self.coalesced = 0
+        #: int: the highest number of queued tags seen
+        self.max_depth = 0
+
+        self.__queue = deque()
+        self.__queued = {}
+        self.__condition = threading.Condition()
+        self.__stopping = False
+        self.__threads = []
+
+    @property
+    def depth(self):
+        """Current number of queued tags."""
+        return len(self.__queue)
+
+    def start(self):
+        """Start the worker threads."""
+        self.__stopping = False
+        self.__threads = [
+            threading.Thread(target=self._work, name="RuuviDispatcher-%i" % i)
+            for i in range(self.workers)
+        ]
+        for thread in self.__threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the worker threads, after the queued tags are handled."""
+        with self.__condition:
+            self.__stopping = True
+            self.__condition.notify_all()
+        for thread in self.__threads:
+            thread.join(timeout)
+        self.__threads = []
+
+    def submit(self, tag, is_new=False):
+        """Queue the tag for the function, never blocks."""
+        with self.__condition:
+            if self.overflow == COALESCE:
+                entry = self.__queued.get(tag.address)
+                if entry is not None:
+                    entry[0] = tag
+                    entry[1] = entry[1] or is_new
+                    self.coalesced += 1
+                    return
+
+            if len(self.__queue) >= self.maxsize:
+                self.dropped += 1
+                if self.overflow == DROP_NEWEST:
+                    return
+                dropped_tag, _ = self.__queue.popleft()
+                self.__queued.pop(dropped_tag.address, None)
+
+            entry = [tag, is_new]
+            self.__queue.append(entry)
+            if self.overflow == COALESCE:
+                self.__queued[tag.address] = entry
+            self.max_depth = max(self.max_depth, len(self.__queue))
+            self.__condition.notify()
+
+    def _work(self):
+        """Main-loop of a worker thread."""
+        while True:
+            with self.__condition:
+                while not self.__queue and not self.__stopping:
+                    self.__condition.wait()
+                if not self.__queue:
+                    return
+                tag, _ = entry = self.__queue.popleft()
+                self.__queued.pop(tag.address, None)
+
+            try:
+                self.function(tag, is_new=entry[1])
+            except Exception:
+                logger.exception("Callback failed for %s", tag.address)
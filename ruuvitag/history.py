@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+
+from .decoder import FIELDS
+
+
+class History(object):
+    """Fixed-capacity ring buffer of the values of a single tag, backed by
+    a preallocated NumPy structured array.
+
+    Every sample is written twice, capacity records apart, so the latest
+    samples are always contiguous and queries return views instead of
+    copies. Views are only valid until the buffer wraps around them.
+
+    Keyword arguments:
+            capacity (int): number of samples to keep. Defaults to 256.
+            fields (iterable): RuuviTag attributes to store.
+                Defaults to ruuvitag.decoder.FIELDS.
+            dtype: NumPy type of the stored values. Defaults to float32.
+    """
+
+    def __init__(self, capacity=256, fields=FIELDS, dtype=np.float32):
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self.dtype = np.dtype(
+            [("timestamp", np.int64)] + [(field, dtype) for field in self.fields]
+        )
+        self.__data = np.zeros(2 * capacity, dtype=self.dtype)
+        self.__position = 0
+        #: int: number of samples appended in total
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self):
+        """Memory used by the buffer, in bytes."""
+        return self.__data.nbytes
+
+    def append(self, tag):
+        """Store the current values and last_seen_ns of a RuuviTag."""
+        row = (tag.last_seen_ns,) + tuple(getattr(tag, field) for field in self.fields)
+        position = self.__position
+        self.__data[position] = row
+        self.__data[position + self.capacity] = row
+        self.__position = (position + 1) % self.capacity
+        self.count += 1
+
+    def samples(self):
+        """Returns a view of all stored samples, oldest first."""
+        return self.last(self.capacity)
+
+    def last(self, n):
+        """Returns a view of the latest n samples, oldest first. Columns
+        are accessed by name, e.g. history.last(10)["temperature"]."""
+        n = min(n, len(self))
+        end = self.__position + self.capacity
+        return self.__data[end - n : end]
+
+    def since(self, timestamp_ns):
+        """Returns a view of the samples with timestamp at or after
+        timestamp_ns (nanoseconds since epoch), oldest first."""
+        samples = self.samples()
+        start = np.searchsorted(samples["timestamp"], timestamp_ns, side="left")
+        return samples[start:]
+
+
+class HistoryRecorder(object):
+    """Keeps a History per tag, usable as the callback of RuuviDaemon or a
+    subscription handler.
+
+    Keyword arguments:
+            capacity (int): see History. Defaults to 256.
+            fields (iterable): see History. Defaults to FIELDS.
+            dtype: see History. Defaults to float32.
+    """
+
+    def __init__(self, capacity=256, fields=FIELDS, dtype=np.float32):
+        self.capacity = capacity
+        self.fields = fields
+        self.dtype = dtype
+        self.histories = {}
+        self.__lock = threading.Lock()
+
+    def __call__(self, tag, is_new=False):
+        """Append the tag, with the signature of a RuuviDaemon callback."""
+        self.append(tag)
+
+    def __getitem__(self, address):
+        return self.histories[address]
+
+    def __contains__(self, address):
+        return address in self.histories
+
+    def append(self, tag):
+        """Append the current values of a RuuviTag to its History."""
+        with self.__lock:
+            history = self.histories.get(tag.address)
+            if history is None:
+                history = self.histories[tag.address] = History(
+                    self.capacity, self.fields, self.dtype
+                )
+            history.append(tag)
+
+    def remove(self, address):
+        """Forget the History of a tag, e.g. from RuuviDaemon.tag_lost."""
+        with self.__lock:
+            self.histories.pop(address, None)
+
+    @property
+    def nbytes(self):
+        """Memory used by all buffers, in bytes."""
+        return sum(history.nbytes for history in self.histories.values())
@@ -0,0 +1,201 @@
+import base64
+import logging
+import time
+from math import isnan
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from .writer import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value):
+    """Escape a tag key or value for line protocol."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(",", r"\,")
+        .replace("=", r"\=")
+        .replace(" ", r"\ ")
+    )
+
+
+def to_line(tag, measurement="ruuvitag", tags=None):
+    """Returns the values of a RuuviTag as an InfluxDB line protocol string.
+    NaN values are left out, as InfluxDB doesn't accept them. Returns None
+    if all values are NaN, as a point needs at least one field.
+
+    Arguments:
+        tag (RuuviTag): the tag to convert.
+
+    Keyword arguments:
+        measurement (str): name of the measurement. Defaults to "ruuvitag".
+        tags (dict): additional tags for the point. Defaults to None.
+    """
+    values = tag.as_dict(timestamp=False)
+    point_tags = {
+        "address": values.pop("address"),
+        "protocol": values.pop("protocol"),
+    }
+    if tags:
+        point_tags.update(tags)
+
+    fields = []
+    for key, value in sorted(values.items()):
+        if isinstance(value, float):
+            if isnan(value):
+                continue
+            fields.append("%s=%r" % (key, value))
+        else:
+            fields.append("%s=%ii" % (key, value))
+    if not fields:
+        return None
+
+    return "%s,%s %s %i" % (
+        _escape(measurement),
+        ",".join(
+            "%s=%s" % (_escape(key), _escape(value))
+            for key, value in sorted(point_tags.items())
+        ),
+        ",".join(fields),
+        tag.last_seen_ns,
+    )
+
+
+class InfluxDBSink(BackgroundWriter):
+    """Writes tags to InfluxDB (1.x HTTP API) in batches from a background
+    thread. Adding points never blocks on the network, so an instance can
+    be used directly as the callback of RuuviDaemon.
+
+    Batches are flushed when batch_size points are buffered or every
+    flush_interval seconds. Failed writes are retried with exponential
+    backoff, when the buffer is full the oldest points are dropped.
+
+    Keyword arguments:
+            url (str): base URL of InfluxDB. Defaults to
+                "http://localhost:8086".
+            database (str): database to write to. Defaults to "ruuvitag".
+            measurement (str): name of the measurement.
+                Defaults to "ruuvitag".
+            username (str): username for basic authentication.
+                Defaults to None.
+            password (str): password for basic authentication.
+                Defaults to None.
+            batch_size (int): maximum number of points per write.
+                Defaults to 500.
+            flush_interval (float): maximum time between writes, in seconds.
+                Defaults to 1.0.
+            max_buffer (int): maximum number of points waiting to be
+                written. Defaults to 10000.
+            retries (int): number of retries of a failed write.
+                Defaults to 5.
+            backoff (float): delay before the first retry, doubled for
+                each retry, in seconds. Defaults to 0.5.
+            timeout (float): timeout of a write, in seconds. Defaults to 5.0.
+    """
+
+    def __init__(
+        self,
+        url="http://localhost:8086",
+        database="ruuvitag",
+        measurement="ruuvitag",
+        username=None,
+        password=None,
+        batch_size=500,
+        flush_interval=1.0,
+        max_buffer=10000,
+        retries=5,
+        backoff=0.5,
+        timeout=5.0,
+    ):
+        self.write_url = "%s/write?%s" % (
+            url.rstrip("/"),
+            urlencode({"db": database, "precision": "ns"}),
+        )
+        self.measurement = measurement
+        self.headers = {"Content-Type": "text/plain; charset=utf-8"}
+        if username is not None:
+            credentials = ("%s:%s" % (username, password or "")).encode("utf-8")
+            self.headers["Authorization"] = "Basic %s" % (
+                base64.b64encode(credentials).decode("ascii")
+            )
+        super(InfluxDBSink, self).__init__(batch_size, flush_interval, max_buffer)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        #: int: points written successfully
+        self.points_written = 0
+        #: int: successful writes
+        self.flushes = 0
+        #: float: duration of the last successful write, in seconds
+        self.last_flush_latency = float("nan")
+        self.__started = None
+
+    @property
+    def points_dropped(self):
+        """Points dropped, as the buffer was full or writing failed."""
+        return self.dropped
+
+    @property
+    def points_per_second(self):
+        """Average rate of written points since start()."""
+        if not self.__started:
+            return 0.0
+        return self.points_written / max(time.time() - self.__started, 1e-9)
+
+    def add(self, tag, tags=None):
+        """Buffer the current values of a RuuviTag for writing.
+
+        Keyword arguments:
+            tags (dict): additional tags for the point. Defaults to None.
+        """
+        line = to_line(tag, measurement=self.measurement, tags=tags)
+        if line is not None:
+            self._append(line)
+
+    def start(self):
+        """Start the background writer thread."""
+        self.__started = time.time()
+        super(InfluxDBSink, self).start()
+
+    def _write(self, lines):
+        """Write lines with flush(), from the writer thread."""
+        self.flush(lines)
+
+    def flush(self, lines):
+        """Write lines to InfluxDB, retrying with backoff. Returns True if
+        the write succeeded."""
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            started = time.time()
+            try:
+                urlopen(
+                    Request(self.write_url, data=body, headers=self.headers),
+                    timeout=self.timeout,
+                ).close()
+            except HTTPError as e:
+                if e.code < 500:
+                    # Client errors, such as malformed points, won't be
+                    # fixed by retrying
+                    logger.error("Writing to InfluxDB failed: %s", e)
+                    break
+                logger.warning("Writing to InfluxDB failed: %s", e)
+            except Exception as e:
+                logger.warning("Writing to InfluxDB failed: %s", e)
+            else:
+                self.last_flush_latency = time.time() - started
+                self.points_written += len(lines)
+                self.flushes += 1
+                return True
+
+            if attempt < self.retries and self._stop.wait(delay):
+                # Stopping, retry without waiting
+                delay = 0
+            delay *= 2
+
+        self.dropped += len(lines)
+        return False
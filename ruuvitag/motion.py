@@ -0,0 +1,139 @@
+import math
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+#: A detected start of movement. delta is the change of the acceleration
+#: vector (g), jerk the change per second (g/s) and angle the change of
+#: its direction (radians), compared to the previous sample.
+MotionEvent = namedtuple(
+    "MotionEvent", ["address", "timestamp_ns", "delta", "jerk", "angle"]
+)
+
+
+# Batch functions operate along the last axis of their inputs, so a 2D
+# array of shape (tags, samples) is handled in a single call. Inputs can
+# be columns of ruuvitag.batch.parse_many or ruuvitag.history.History.
+
+
+def magnitude(x, y, z):
+    """Returns the magnitude of acceleration vectors (g)."""
+    x, y, z = (np.asarray(axis, dtype=np.float64) for axis in (x, y, z))
+    return np.sqrt(x * x + y * y + z * z)
+
+
+def delta(x, y, z):
+    """Returns the magnitude of the change between consecutive
+    acceleration vectors (g), one sample shorter than the input."""
+    return magnitude(np.diff(x), np.diff(y), np.diff(z))
+
+
+def jerk(x, y, z, timestamps_ns):
+    """Returns the change between consecutive acceleration vectors per
+    second (g/s), one sample shorter than the input. Samples with equal
+    timestamps give NaN."""
+    seconds = np.diff(np.asarray(timestamps_ns, dtype=np.float64)) / 1e9
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(seconds > 0, delta(x, y, z) / seconds, np.nan)
+
+
+def orientation_change(x, y, z):
+    """Returns the angle between consecutive acceleration vectors
+    (radians), one sample shorter than the input."""
+    x, y, z = (np.asarray(axis, dtype=np.float64) for axis in (x, y, z))
+    dot = x[..., 1:] * x[..., :-1] + y[..., 1:] * y[..., :-1] + z[..., 1:] * z[..., :-1]
+    lengths = magnitude(x, y, z)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cosine = dot / (lengths[..., 1:] * lengths[..., :-1])
+    return np.arccos(np.clip(cosine, -1.0, 1.0))
+
+
+def crossings(values, threshold):
+    """Returns a boolean array, True where values rise above threshold
+    compared to the previous sample, one sample shorter than the input."""
+    values = np.asarray(values)
+    return (values[..., 1:] > threshold) & ~(values[..., :-1] > threshold)
+
+
+class MotionTracker(object):
+    """Incremental software motion detection from acceleration, costing
+    O(1) per sample. Works with any protocol, so also with firmware not
+    reporting movement_counter.
+
+    A movement starts when the acceleration vector changes by at least
+    threshold, or turns by at least angle_threshold, between samples.
+    On the start of a movement, movement_detected of the tag is set and
+    callback is called with a MotionEvent. Usable as the callback of
+    RuuviDaemon.
+
+    Keyword arguments:
+            threshold (float): change of acceleration (g).
+                Defaults to 0.1.
+            angle_threshold (float): change of orientation (radians).
+                Defaults to 10 degrees.
+            callback: function to call with each MotionEvent.
+                Defaults to None.
+    """
+
+    def __init__(self, threshold=0.1, angle_threshold=math.radians(10), callback=None):
+        self.threshold = threshold
+        self.angle_threshold = angle_threshold
+        self.callback = callback
+        self.__previous = {}
+        self.__lock = threading.Lock()
+
+    def __call__(self, tag, is_new=False):
+        """Update with the tag, with the signature of a RuuviDaemon
+        callback."""
+        self.update(tag)
+
+    def update(self, tag):
+        """Update with the latest values of a RuuviTag. Returns a
+        MotionEvent if a movement started, otherwise None."""
+        x, y, z = tag.acceleration_x, tag.acceleration_y, tag.acceleration_z
+        timestamp = tag.last_seen_ns
+        if math.isnan(x) or math.isnan(y) or math.isnan(z):
+            return None
+
+        with self.__lock:
+            previous = self.__previous.get(tag.address)
+            if previous is not None and previous[3] == timestamp:
+                return None
+            if previous is None:
+                self.__previous[tag.address] = (x, y, z, timestamp, False)
+                return None
+
+            px, py, pz, previous_timestamp, was_moving = previous
+            change = math.sqrt((x - px) ** 2 + (y - py) ** 2 + (z - pz) ** 2)
+            lengths = math.sqrt(x * x + y * y + z * z) * math.sqrt(
+                px * px + py * py + pz * pz
+            )
+            angle = 0.0
+            if lengths:
+                angle = math.acos(
+                    max(-1.0, min(1.0, (x * px + y * py + z * pz) / lengths))
+                )
+            moving = change >= self.threshold or angle >= self.angle_threshold
+            self.__previous[tag.address] = (x, y, z, timestamp, moving)
+
+        if not moving or was_moving:
+            return None
+
+        seconds = (timestamp - previous_timestamp) / 1e9
+        event = MotionEvent(
+            tag.address,
+            timestamp,
+            change,
+            change / seconds if seconds > 0 else float("nan"),
+            angle,
+        )
+        tag.movement_detected.set()
+        if self.callback:
+            self.callback(event)
+        return event
+
+    def remove(self, address):
+        """Forget the state of a tag, e.g. from RuuviDaemon.tag_lost."""
+        with self.__lock:
+            self.__previous.pop(address, None)
@@ -0,0 +1,228 @@
+import mmap
+import multiprocessing
+import threading
+
+import numpy as np
+
+from .batch import MEASUREMENT_DTYPE, as_matrix, parse_matrix
+
+# Buffers of the worker processes, inherited from the parent on fork
+_shared = {}
+
+# Multiplier of Fibonacci hashing, spreading addresses of consecutive
+# numbers evenly over the shards
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _views(buffers, capacity, width):
+    """Returns the arrays of the shared buffers: addresses, payloads,
+    lengths, shards and results."""
+    addresses, payloads, lengths, shards, results = buffers
+    return (
+        np.frombuffer(addresses, dtype=np.uint8, count=capacity * 8).reshape(
+            capacity, 8
+        ),
+        np.frombuffer(payloads, dtype=np.uint8, count=capacity * width).reshape(
+            capacity, width
+        ),
+        np.frombuffer(lengths, dtype=np.intp, count=capacity),
+        np.frombuffer(shards, dtype=np.intp, count=capacity),
+        np.frombuffer(results, dtype=MEASUREMENT_DTYPE, count=capacity),
+    )
+
+
+def _init(buffers, capacity, width):
+    (
+        _shared["addresses"],
+        _shared["payloads"],
+        _shared["lengths"],
+        _shared["shards"],
+        _shared["results"],
+    ) = _views(buffers, capacity, width)
+
+
+def _decode(shard, count):
+    """Decode the rows of a shard of the shared buffers in a worker."""
+    rows = np.flatnonzero(_shared["shards"][:count] == shard)
+    if rows.size:
+        # Rows in ascending order, so in order of arrival
+        _shared["results"][rows] = parse_matrix(
+            _shared["payloads"][rows], _shared["lengths"][rows]
+        )
+
+
+def pack_addresses(addresses, out=None):
+    """Returns MAC addresses as rows of 8 bytes, the 6 bytes of the address
+    followed by 2 zero bytes, as used by ShardedDecoder.
+
+    Arguments:
+        addresses (sequence of str): MAC addresses, "aa:bb:cc:dd:ee:ff".
+
+    Keyword arguments:
+        out (2D uint8 array): array to write to, with 8 columns and at
+            least a row per address. Defaults to a new array.
+    """
+    packed = np.frombuffer(
+        bytes.fromhex("".join(addresses).replace(":", "")), dtype=np.uint8
+    ).reshape(-1, 6)
+    if out is None:
+        out = np.empty((len(packed), 8), dtype=np.uint8)
+    out = out[: len(packed)]
+    out[:, :6] = packed
+    out[:, 6:] = 0
+    return out
+
+
+class ShardedDecoder(object):
+    """Decodes batches of data received from many RuuviTags on a pool of
+    worker processes, for gateways aggregating more traffic than a single
+    core can handle.
+
+    Each batch is sharded by a hash of the address, so all packets of a
+    tag are decoded by the same worker, in order of arrival. Addresses,
+    payloads and results are exchanged through shared memory mapped before
+    the workers are forked, only the shard numbers are sent to the workers,
+    which select, decode and store the rows of their shard. Requires the
+    fork start method, i.e. Linux or macOS.
+
+    decode() packs the addresses and payloads in the calling process. To
+    keep that serial part small, callers receiving packets in bulk can
+    write them directly to the shared memory, see buffers().
+
+    Usable as a context manager, which closes the pool on exit.
+
+    Keyword arguments:
+            workers (int): number of worker processes.
+                Defaults to the number of CPUs.
+            capacity (int): maximum number of packets in a batch,
+                larger batches are decoded in chunks. Defaults to 65536.
+            width (int): maximum length of a payload, longer payloads
+                are truncated. Defaults to 64.
+    """
+
+    def __init__(self, workers=None, capacity=65536, width=64):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.capacity = capacity
+        self.width = width
+
+        self.__buffers = tuple(
+            mmap.mmap(-1, capacity * size)
+            for size in (
+                8,
+                width,
+                np.dtype(np.intp).itemsize,
+                np.dtype(np.intp).itemsize,
+                MEASUREMENT_DTYPE.itemsize,
+            )
+        )
+        (
+            self.__addresses,
+            self.__payloads,
+            self.__lengths,
+            self.__shards,
+            self.__results,
+        ) = _views(self.__buffers, capacity, width)
+        self.__lock = threading.Lock()
+        self.__pool = multiprocessing.get_context("fork").Pool(
+            self.workers, _init, (self.__buffers, capacity, width)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the worker processes and release the shared memory."""
+        if self.__pool is None:
+            return
+        self.__pool.close()
+        self.__pool.join()
+        self.__pool = None
+        self.__addresses = self.__payloads = self.__lengths = None
+        self.__shards = self.__results = None
+        for buffer in self.__buffers:
+            try:
+                buffer.close()
+            except BufferError:
+                # Still used by arrays of buffers(), unmapped with them
+                pass
+
+    def buffers(self):
+        """Returns the input arrays in shared memory, with capacity rows:
+        addresses (packed as by pack_addresses), payloads (zero-padded,
+        see ruuvitag.batch.as_matrix, which writes to it with out) and
+        lengths of the payloads. Fill their first rows, and decode them
+        with decode_buffers().
+
+        The buffers are also used by decode(), don't use both from
+        several threads.
+        """
+        return self.__addresses, self.__payloads, self.__lengths
+
+    def decode(self, addresses, payloads):
+        """Decode a batch of received data, see ruuvitag.batch.parse_many.
+
+        Arguments:
+            addresses (sequence of str): MAC addresses of RuuviTags.
+            payloads (sequence of bytes or 2D uint8 array): received data,
+                in order of arrival.
+
+        Returns a structured array of MEASUREMENT_DTYPE, one row per
+        payload, in the order of the arguments.
+        """
+        result = np.zeros(len(addresses), dtype=MEASUREMENT_DTYPE)
+        result["address"] = addresses
+        for start in range(0, len(addresses), self.capacity):
+            end = start + self.capacity
+            with self.__lock:
+                self._check()
+                pack_addresses(addresses[start:end], out=self.__addresses)
+                _, lengths = as_matrix(
+                    payloads[start:end], self.width, out=self.__payloads
+                )
+                self.__lengths[: len(lengths)] = lengths
+                self._decode(len(lengths), result[start:end])
+        return result
+
+    def decode_buffers(self, count, out=None):
+        """Decode the first count rows of buffers().
+
+        Arguments:
+            count (int): number of packets, at most capacity.
+
+        Keyword arguments:
+            out (array of MEASUREMENT_DTYPE): array to write the results to,
+                address is left untouched. Defaults to a new array, with
+                empty addresses.
+        """
+        if count > self.capacity:
+            raise ValueError("count exceeds capacity")
+        if out is None:
+            out = np.zeros(count, dtype=MEASUREMENT_DTYPE)
+        with self.__lock:
+            self._check()
+            self._decode(count, out)
+        return out
+
+    def _check(self):
+        """Raise ValueError if the decoder is closed."""
+        if self.__pool is None:
+            raise ValueError("decoder is closed")
+
+    def _decode(self, count, out):
+        """Decode the first count rows of the buffers into out, called
+        while holding the lock."""
+        # Fibonacci hash of the address, vectorized over the batch
+        keys = self.__addresses[:count].view(np.uint64).reshape(-1)
+        shards = self.__shards[:count]
+        hashes = shards.view(np.uint64)
+        np.multiply(keys, _HASH_MULTIPLIER, out=hashes)
+        hashes >>= np.uint64(33)
+        shards %= self.workers
+
+        self.__pool.starmap(_decode, [(shard, count) for shard in range(self.workers)])
+        decoded = self.__results[:count]
+        for name in MEASUREMENT_DTYPE.names[1:]:
+            out[name] = decoded[name]
@@ -1,16 +1,39 @@
+import functools
 import threading
+import time
+from collections import OrderedDict
+from time import time_ns
 
-from bluepy import btle
-from ruuvitag import RuuviTag
+from ruuvitag.backends import Backend, BluepyBackend
+from ruuvitag.ruuvitag import RuuviTag
+from ruuvitag.decoder import RUUVI_MANUFACTURER_DATA, decode
+from ruuvitag.dispatcher import DROP_OLDEST, Dispatcher
+
+#: Number of measurement sequences before the latest recognized as stale.
+DEDUPLICATION_WINDOW = 16
+
+#: measurement_sequence of protocol 5 meaning "not available".
+SEQUENCE_NOT_AVAILABLE = 65535
+
+
+def _is_newer(sequence, latest):
+    """Whether measurement_sequence follows latest, allowing for wrapping.
+    Sequences up to DEDUPLICATION_WINDOW before latest are stale, others
+    are newer, so a rebooted tag isn't ignored. Sequences not available
+    are always newer."""
+    if sequence == SEQUENCE_NOT_AVAILABLE or latest == SEQUENCE_NOT_AVAILABLE:
+        return True
+    difference = (sequence - latest) % 65535
+    return 0 < difference < 65535 - DEDUPLICATION_WINDOW
 
 
 class RuuviDaemon(threading.Thread):
     """A threaded scanner for RuuviTags."""
 
-    class ScanDelegate(btle.DefaultDelegate):
+    class ScanDelegate(object):
         """
-        Custom delegate to receive btle scan results,
-        used internally to notify RuuviDaemon.
+        Custom delegate to receive btle scan results and notify
+        RuuviDaemon, for using RuuviDaemon with an own btle.Scanner.
 
         Keyword arguments:
                 interface_index (int): the index of bluetooth device to use.
@@ -20,56 +43,439 @@ class RuuviDaemon(threading.Thread):
                     Function signature is callback(tag, is_new: False)
         """
 
-        def __init__(self, daemon, *args, **kwargs):
+        def __init__(self, daemon, interface_index=None, *args, **kwargs):
             self.daemon = daemon
-            # Use old style class to initialize,
-            # as that's required by btle ":D"
-            btle.DefaultDelegate.__init__(self, *args, **kwargs)
+            self.interface_index = interface_index
 
         def handleDiscovery(self, device, is_new_device, is_new_data):
             """Call update_tag method from RuuviDaemon."""
-            self.daemon.update_tag(device)
+            self.daemon.update_tag(device, interface_index=self.interface_index)
 
-    def __init__(self, interface_index=0, callback=None, *args, **kwargs):
+    def __init__(
+        self,
+        interface_index=0,
+        callback=None,
+        *args,
+        deduplicate=None,
+        cache_size=0,
+        workers=0,
+        queue_size=1000,
+        overflow=DROP_OLDEST,
+        recorder=None,
+        foreign_cache_size=1024,
+        foreign_cache_ttl=300.0,
+        allowed_addresses=None,
+        tag_ttl=None,
+        max_tags=None,
+        found_callback=None,
+        lost_callback=None,
+        backend=BluepyBackend,
+        **kwargs
+    ):
+        """Initialize an instance of RuuviDaemon.
+
+        Keyword arguments:
+                interface_index (int or list): the index of bluetooth device
+                    to use, or a list of indexes to scan on several
+                    devices concurrently. Defaults to 0.
+                callback: function to call when receiving data.
+                    Defaults to None.
+                    Function signature is callback(tag, is_new: False)
+                deduplicate (bool): drop rebroadcasts of a measurement,
+                    before decoding if the raw payload is the latest
+                    payload of the tag, and before callback if the
+                    measurement_sequence of a protocol 5 tag is not newer
+                    than the latest. Defaults to True when scanning on
+                    several devices, otherwise False.
+                cache_size (int): number of raw payloads to keep in a LRU
+                    cache of decoded measurements, so repeated payloads
+                    aren't decoded again. Defaults to 0 (disabled).
+                workers (int): number of threads running the callback,
+                    see ruuvitag.dispatcher.Dispatcher. Defaults to 0,
+                    running the callback in the scanner thread.
+                queue_size (int): maximum number of tags waiting for
+                    workers. Defaults to 1000.
+                overflow (str): policy for a full queue, DROP_OLDEST,
+                    DROP_NEWEST or COALESCE from ruuvitag.dispatcher.
+                    Defaults to DROP_OLDEST.
+                recorder: object whose write(device) is called with every
+                    received advertisement, such as
+                    ruuvitag.capture.CaptureWriter. Defaults to None.
+                foreign_cache_size (int): number of addresses sending
+                    advertisements without Ruuvi data to remember, their
+                    advertisements are rejected without looking at the
+                    data. Defaults to 1024, 0 disables.
+                foreign_cache_ttl (float): seconds to remember such an
+                    address for. Defaults to 300.
+                allowed_addresses (iterable): MAC addresses to handle,
+                    advertisements of other devices are dropped before
+                    decoding. Defaults to None, allowing all.
+                tag_ttl (float): seconds after which a tag not heard from
+                    is removed from tags and reported lost.
+                    Defaults to None, keeping tags forever.
+                max_tags (int): maximum number of tags to keep, the least
+                    recently heard tag is removed and reported lost when
+                    exceeded. Defaults to None, unbounded.
+                found_callback: function to call when a tag is added to
+                    tags. Function signature is found_callback(tag).
+                    Defaults to None.
+                lost_callback: function to call when a tag is removed from
+                    tags. Function signature is lost_callback(tag).
+                    Defaults to None.
+                backend: source of advertisements, see ruuvitag.backends.
+                    Either a function returning a Backend for an
+                    interface_index, such as a Backend class, or a Backend
+                    instance when scanning a single device.
+                    Defaults to BluepyBackend.
+        """
         self.__stop = threading.Event()
+        self.__lock = threading.Lock()
         self.interface_index = interface_index
+        if isinstance(interface_index, int):
+            self.interface_indexes = [interface_index]
+        else:
+            self.interface_indexes = list(interface_index)
+        if isinstance(backend, Backend):
+            if len(self.interface_indexes) != 1:
+                raise ValueError("a Backend instance can only scan one device")
+            #: list: Backend of each interface_indexes
+            self.backends = [backend]
+        else:
+            self.backends = [backend(index) for index in self.interface_indexes]
         self.callback_function = callback
         self.tags = {}
         self.__new_devices_found = threading.Event()
+
+        if deduplicate is None:
+            deduplicate = len(self.interface_indexes) > 1
+        self.deduplicate = deduplicate
+        # Latest accepted raw payload by address
+        self.__payloads = {}
+        #: int: packets dropped, as the raw payload was recently received
+        self.duplicate_payloads = 0
+        #: int: packets dropped, as the measurement_sequence wasn't newer
+        self.duplicate_sequences = 0
+
+        if cache_size:
+            self.__decode = functools.lru_cache(maxsize=cache_size)(decode)
+        else:
+            self.__decode = decode
+
+        #: Dispatcher: the worker pool running callbacks, if workers > 0
+        self.dispatcher = None
+        if workers:
+            self.dispatcher = Dispatcher(
+                self.notify, workers=workers, maxsize=queue_size, overflow=overflow
+            )
+
+        self.recorder = recorder
+
+        self.foreign_cache_size = foreign_cache_size
+        self.foreign_cache_ttl = foreign_cache_ttl
+        self.__foreign = OrderedDict()
+        #: int: packets containing Ruuvi manufacturer data
+        self.accepted = 0
+        #: int: packets rejected, as they weren't from a RuuviTag
+        self.rejected = 0
+
+        self.allowed_addresses = None
+        if allowed_addresses is not None:
+            self.allowed_addresses = frozenset(
+                address.lower() for address in allowed_addresses
+            )
+        #: int: packets dropped, as the address wasn't allowed
+        self.not_allowed = 0
+        self.__subscriptions = {}
+        self.__predicates = ()
+
+        self.tag_ttl = tag_ttl
+        self.max_tags = max_tags
+        self.found_callback = found_callback
+        self.lost_callback = lost_callback
+        # Monotonic time of the latest update by address, ordered from the
+        # least recently updated, only tracked when tags are evicted
+        self.__updated = None
+        if tag_ttl or max_tags:
+            self.__updated = OrderedDict()
+
         super(RuuviDaemon, self).__init__(*args, **kwargs)
 
     def run(self):
         """Main-loop of the daemon, started via daemon.start()."""
-        scanner = btle.Scanner().withDelegate(RuuviDaemon.ScanDelegate(self))
-        scanner.start(passive=True)
+        if self.dispatcher:
+            self.dispatcher.start()
+
+        # Scan on additional devices in their own threads
+        threads = [
+            threading.Thread(
+                target=self.scan, args=(interface_index,), name="RuuviScan-%i" % i
+            )
+            for i, interface_index in enumerate(self.interface_indexes[1:], 1)
+        ]
+        if self.tag_ttl:
+            threads.append(
+                threading.Thread(target=self._expire_loop, name="RuuviExpire")
+            )
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        self.scan(self.interface_indexes[0])
 
-        while not self.__stop.is_set():
-            scanner.process(timeout=0.1)
+        for thread in threads[: len(self.interface_indexes) - 1]:
+            thread.join()
+        # Backends may also end on their own, e.g. at the end of a capture
+        self.__stop.set()
+        for thread in threads:
+            thread.join()
+
+        if self.dispatcher:
+            self.dispatcher.stop()
+
+    def scan(self, interface_index):
+        """Scan on a single bluetooth device until the daemon is stopped."""
+        backend = self.backends[self.interface_indexes.index(interface_index)]
+        backend.start()
+        if self.__stop.is_set():
+            backend.stop()
+
+        for device in backend:
+            self.update_tag(device, interface_index=interface_index)
 
-        scanner.stop()
+    def _expire_loop(self):
+        """Evict tags periodically, even when no advertisements arrive."""
+        while not self.__stop.wait(min(self.tag_ttl / 10.0, 1.0)):
+            self.expire()
 
     def stop(self):
         """Used to stop the (running) daemon."""
         self.__stop.set()
+        for backend in self.backends:
+            backend.stop()
+
+    def update_tag(self, device, interface_index=None):
+        """Updates the RuuviTag, based on an advertisement received from
+        a backend.
+
+        Arguments:
+            device: the received advertisement, with addr, rssi and rawData
+                attributes, such as bluepy's ScanEntry.
+
+        Keyword arguments:
+            interface_index (int): the index of bluetooth device the
+                advertisement was received with. Defaults to None.
+        """
+        if self.recorder:
+            self.recorder.write(device)
+
+        events = []
+        with self.__lock:
+            self._update_tag(device, interface_index, events)
+        # Callbacks run without the lock, so a slow callback doesn't block
+        # scanning on other devices, and callbacks may call expire()
+        for event in events:
+            event()
+
+    def _update_tag(self, device, interface_index, events):
+        """See update_tag, called while holding the lock. Appends the
+        callbacks to run to events."""
+        # Backends may report addresses in upper case
+        address = device.addr.lower()
+        if self.allowed_addresses is not None and address not in self.allowed_addresses:
+            self.not_allowed += 1
+            return
+
+        if not self._accept(address, device.rawData):
+            self.rejected += 1
+            return
+        self.accepted += 1
+
+        if self.deduplicate:
+            # Only the latest payload, as protocol 3 has no measurement
+            # sequence and its values may return to earlier ones
+            if self.__payloads.get(address) == device.rawData:
+                self.duplicate_payloads += 1
+                tag = self.tags.get(address)
+                if tag is not None:
+                    # The tag is still transmitting, don't let it expire
+                    tag.last_seen_ns = time_ns()
+                    if self.__updated is not None:
+                        self._touch(tag.address, events)
+                    # Keep track of the device receiving the tag best
+                    if tag.rssi is None or device.rssi > tag.rssi:
+                        tag.rssi = device.rssi
+                        tag.interface_index = interface_index
+                return
 
-    def update_tag(self, device):
-        """Updates the RuuviTag, based on the information received from
-        ScanDelegate.handleDiscovery."""
         try:
-            tag = RuuviTag.parse(device.addr, device.rawData)
+            measurement = self.__decode(address, device.rawData)
         except:
-            tag = None
+            measurement = None
 
-        if not tag:
+        if not measurement:
             return
 
-        is_new = False
-        if tag.address not in self.tags:
-            self.tags[tag.address] = tag
-            is_new = True
+        tag = self.tags.get(measurement.address)
+        is_new = tag is None
+        if is_new:
+            tag = self.tags[measurement.address] = RuuviTag(*measurement)
+        if self.__updated is not None:
+            self._touch(tag.address, events)
+
+        if is_new:
+            events.append(functools.partial(self.tag_found, tag))
+        elif (
+            self.deduplicate
+            and measurement.protocol == 5
+            and not _is_newer(
+                measurement.measurement_sequence, tag.measurement_sequence
+            )
+        ):
+            self.duplicate_sequences += 1
+            return
+        else:
+            tag.apply(measurement)
+        if self.deduplicate:
+            self.__payloads[address] = device.rawData
+
+        tag.rssi = device.rssi
+        tag.interface_index = interface_index
+
+        if self.dispatcher:
+            # Queue a snapshot, as the tag is updated by later packets
+            events.append(
+                functools.partial(self.dispatcher.submit, tag.copy(), is_new=is_new)
+            )
+        elif len(self.backends) > 1:
+            # A snapshot, as the tag may be updated by another device while
+            # the callback runs
+            events.append(functools.partial(self.notify, tag.copy(), is_new=is_new))
+        else:
+            events.append(functools.partial(self.notify, tag, is_new=is_new))
+
+    def _touch(self, address, events):
+        """Mark the tag as updated, and evict tags exceeding tag_ttl or
+        max_tags, appending their tag_lost to events."""
+        now = time.monotonic()
+        self.__updated[address] = now
+        self.__updated.move_to_end(address)
+
+        if self.max_tags:
+            while len(self.__updated) > self.max_tags:
+                self._evict(next(iter(self.__updated)), events)
+        if self.tag_ttl:
+            self._expire(now, events)
+
+    def _expire(self, now, events):
+        """Evict tags not updated within tag_ttl, oldest first."""
+        while self.__updated:
+            address, updated = next(iter(self.__updated.items()))
+            if updated + self.tag_ttl > now:
+                return
+            self._evict(address, events)
+
+    def _evict(self, address, events):
+        """Remove the tag, appending its tag_lost to events."""
+        del self.__updated[address]
+        self.__payloads.pop(address, None)
+        tag = self.tags.pop(address, None)
+        if tag is not None:
+            events.append(functools.partial(self.tag_lost, tag))
+
+    def expire(self):
+        """Evict tags not heard from within tag_ttl. Called periodically
+        by the running daemon."""
+        if not self.tag_ttl:
+            return
+        events = []
+        with self.__lock:
+            self._expire(time.monotonic(), events)
+        for event in events:
+            event()
+
+    def tag_found(self, tag):
+        """Called when a tag is added to tags."""
+        if self.found_callback:
+            self.found_callback(tag)
+
+    def tag_lost(self, tag):
+        """Called when a tag is removed from tags, after not being heard
+        from within tag_ttl or to make room for others."""
+        if self.lost_callback:
+            self.lost_callback(tag)
+
+    def _accept(self, address, data):
+        """Cheap check whether the advertisement may be from a RuuviTag,
+        remembering addresses of other devices for foreign_cache_ttl."""
+        if self.__foreign:
+            expires = self.__foreign.get(address)
+            if expires is not None:
+                if expires > time.monotonic():
+                    return False
+                del self.__foreign[address]
+
+        if data and RUUVI_MANUFACTURER_DATA in data:
+            return True
+
+        # Never ignore a known tag, it might just be in a different mode
+        if self.foreign_cache_size and address not in self.tags:
+            self.__foreign[address] = time.monotonic() + self.foreign_cache_ttl
+            if len(self.__foreign) > self.foreign_cache_size:
+                self.__foreign.popitem(last=False)
+        return False
+
+    def cache_info(self):
+        """Returns hits, misses, maxsize and currsize of the decode cache,
+        or None if the cache is disabled."""
+        if self.__decode is decode:
+            return None
+        return self.__decode.cache_info()
+
+    def subscribe(self, address_or_predicate, handler):
+        """Call handler for updates of a single tag, or of tags matching
+        a predicate. Can be called while the daemon is running.
+
+        Arguments:
+            address_or_predicate: MAC address of the tag, or a function
+                returning True for tags to handle, with signature
+                predicate(tag).
+            handler: function to call, with the signature of callback.
+        """
+        if callable(address_or_predicate):
+            self.__predicates += ((address_or_predicate, handler),)
+        else:
+            address = address_or_predicate.lower()
+            self.__subscriptions[address] = self.__subscriptions.get(address, ()) + (
+                handler,
+            )
+
+    def unsubscribe(self, address_or_predicate, handler):
+        """Remove a handler added with subscribe."""
+        if callable(address_or_predicate):
+            self.__predicates = tuple(
+                subscription
+                for subscription in self.__predicates
+                if subscription != (address_or_predicate, handler)
+            )
+        else:
+            address = address_or_predicate.lower()
+            handlers = tuple(
+                h for h in self.__subscriptions.get(address, ()) if h != handler
+            )
+            if handlers:
+                self.__subscriptions[address] = handlers
+            else:
+                self.__subscriptions.pop(address, None)
+
+    def notify(self, tag, is_new=False):
+        """Run callback and the handlers subscribed to the tag."""
+        self.callback(tag, is_new=is_new)
 
-        self.tags[tag.address].update(**tag.as_dict())
-        self.callback(self.tags[tag.address], is_new=is_new)
+        for handler in self.__subscriptions.get(tag.address, ()):
+            handler(tag, is_new=is_new)
+        for predicate, handler in self.__predicates:
+            if predicate(tag):
+                handler(tag, is_new=is_new)
 
     def callback(self, tag, is_new=False):
         """Callback to run when a broadcast from a RuuviTag has been
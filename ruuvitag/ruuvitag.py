@@ -1,8 +1,13 @@
-import arrow
-from threading import Event
+import calendar
+import copy
+import struct
+from datetime import datetime, timedelta, timezone
+from threading import Event, Timer
+from time import time_ns
 
-from bluepy import btle
-from bitstring import BitArray
+from .decoder import decode
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 class RuuviTag(object):
@@ -43,7 +48,8 @@ class RuuviTag(object):
             measurement_sequence (int): measurement_sequence. Defaults to NaN.
         """
 
-        self.last_seen = arrow.utcnow()
+        #: int: time of the latest update, in nanoseconds since epoch
+        self.last_seen_ns = time_ns()
         self.address = address
         self.protocol = protocol
         self.temperature = temperature
@@ -60,13 +66,39 @@ class RuuviTag(object):
         #: Event: event to signify movement detection
         self.movement_detected = Event()
 
+        #: int: signal strength of the latest advertisement, if known
+        self.rssi = None
+        #: int: index of the bluetooth device receiving the tag, if known
+        self.interface_index = None
+
     def __repr__(self):
         return "<RuuviTag V%i %s %.02fc, %.02f%%, %s>" % (
             self.protocol,
             self.address,
             self.temperature,
             self.humidity,
-            self.last_seen.isoformat(),
+            self.last_seen_datetime.isoformat(),
+        )
+
+    @property
+    def last_seen_datetime(self):
+        """Time of the latest update as a timezone aware datetime (UTC)."""
+        return EPOCH + timedelta(microseconds=self.last_seen_ns // 1000)
+
+    @property
+    def last_seen(self):
+        """Time of the latest update as an Arrow. arrow is imported on
+        first access, use last_seen_ns or last_seen_datetime to avoid it."""
+        import arrow
+
+        return arrow.Arrow.fromdatetime(self.last_seen_datetime)
+
+    @last_seen.setter
+    def last_seen(self, value):
+        value = getattr(value, "datetime", value)
+        self.last_seen_ns = (
+            calendar.timegm(value.utctimetuple()) * 1000000000
+            + value.microsecond * 1000
         )
 
     def update(
@@ -107,7 +139,7 @@ class RuuviTag(object):
                 previous value
         """
 
-        self.last_seen = arrow.utcnow()
+        self.last_seen_ns = time_ns()
 
         self.temperature = temperature
         self.humidity = humidity
@@ -124,8 +156,47 @@ class RuuviTag(object):
         self.movement_counter = movement_counter
         self.measurement_sequence = measurement_sequence
 
-    def as_dict(self):
-        """Returns all (significant) values as a dictionary."""
+    def apply(self, measurement):
+        """Update the RuuviTag instance in place from a Measurement,
+        as returned by ruuvitag.decoder.decode.
+
+        Behaves like RuuviTag.update, but without building keyword
+        arguments or an intermediate RuuviTag.
+        """
+        self.last_seen_ns = time_ns()
+
+        (
+            _,
+            _,
+            self.temperature,
+            self.humidity,
+            self.pressure,
+            self.acceleration_x,
+            self.acceleration_y,
+            self.acceleration_z,
+            self.battery_voltage,
+            self.tx_power,
+            movement_counter,
+            self.measurement_sequence,
+        ) = measurement
+
+        if movement_counter != self.movement_counter:
+            self.movement_detected.set()
+
+        self.movement_counter = movement_counter
+
+    def copy(self):
+        """Returns a snapshot of the current values. The snapshot shares
+        movement_detected with this tag."""
+        return copy.copy(self)
+
+    def as_dict(self, timestamp=True):
+        """Returns all (significant) values as a dictionary.
+
+        Keyword args:
+            timestamp (bool): include last_seen, as an Arrow.
+                Defaults to True.
+        """
         values = {
             "address": self.address,
             "protocol": self.protocol,
@@ -136,8 +207,9 @@ class RuuviTag(object):
             "acceleration_y": self.acceleration_y,
             "acceleration_z": self.acceleration_z,
             "battery_voltage": self.battery_voltage,
-            "last_seen": self.last_seen,
         }
+        if timestamp:
+            values["last_seen"] = self.last_seen
         if self.protocol == 5:
             values.update(
                 {
@@ -157,6 +229,22 @@ class RuuviTag(object):
             address (str): MAC address of RuuviTag.
             data (bytes): received data in bytes.
         """
+        try:
+            measurement = decode(address, data)
+        except (struct.error, TypeError, AttributeError):
+            # Truncated payload or data of unexpected type,
+            # let the BitArray-based parser deal with it.
+            return cls._parse_bitarray(address, data)
+
+        if measurement is None:
+            return None
+        return cls(*measurement)
+
+    @classmethod
+    def _parse_bitarray(cls, address, data):
+        """Fallback parser using BitArray, see RuuviTag.parse."""
+        from bitstring import BitArray
+
         b = BitArray(bytes=data)
 
         # Try to find protocol version 3
@@ -254,18 +342,58 @@ class RuuviTag(object):
             )
 
     @classmethod
-    def scan(cls, interface_index=0, timeout=2):
-        """Scan for RuuviTags. Yields RuuviTags as they're found.
+    def scan(cls, interface_index=0, timeout=2, unique=True, backend=None):
+        """Scan for RuuviTags. Yields RuuviTags as they're received.
+
+        The scan ends after timeout, when the generator is closed (e.g. by
+        breaking out of a loop over it), or when backend.stop() is called
+        from any thread.
 
         Keyword arguments:
                 interface_index: The index of bluetooth device to use.
                     Defaults to 0
-                timeout (float): Timeout for the scan. Defaults to 2.0.
+                timeout (float): Duration of the scan, in seconds, or None
+                    to scan until stopped. Defaults to 2.0.
+                unique (bool): Yield only the first advertisement of each
+                    RuuviTag, otherwise yield a new RuuviTag for every
+                    advertisement. Defaults to True.
+                backend (ruuvitag.backends.Backend): Source of
+                    advertisements. Defaults to a BluepyBackend on
+                    interface_index.
         """
-        for device in btle.Scanner(interface_index).scan(timeout):
-            try:
-                tag = cls.parse(device.addr, device.rawData)
+        from .backends import BluepyBackend
+
+        if backend is None:
+            backend = BluepyBackend(interface_index)
+        timer = None
+        if timeout is not None:
+            timer = Timer(timeout, backend.stop)
+            timer.daemon = True
+
+        seen = set()
+        backend.start()
+        advertisements = iter(backend)
+        try:
+            if timer is not None:
+                timer.start()
+            for device in advertisements:
+                if unique and device.addr in seen:
+                    continue
+                try:
+                    tag = cls.parse(device.addr, device.rawData)
+                except:
+                    continue
                 if tag:
+                    if unique:
+                        seen.add(device.addr)
+                    tag.rssi = device.rssi
+                    tag.interface_index = interface_index
                     yield tag
-            except:
-                pass
+        finally:
+            if timer is not None:
+                timer.cancel()
+            backend.stop()
+            # Let a generator based backend release the device right away
+            close = getattr(advertisements, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,326 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from .decoder import FIELDS
+from .writer import BackgroundWriter
+
+logger = logging.getLogger(__name__)
+
+NS_PER_HOUR = 3600 * 1000000000
+NS_PER_SECOND = 1000000000
+
+#: Statistics kept of each field in the hourly rollups.
+ROLLUP_STATISTICS = ("count", "sum", "min", "max")
+
+
+def _schema(fields):
+    """Returns the statements creating the tables for fields."""
+    values = ", ".join("%s REAL" % field for field in fields)
+    statistics = ", ".join(
+        "%s_%s %s" % (field, statistic, "INTEGER" if statistic == "count" else "REAL")
+        for field in fields
+        for statistic in ROLLUP_STATISTICS
+    )
+    return [
+        # Clustered on (address, timestamp), so the primary key is the
+        # covering index of queries and retention
+        "CREATE TABLE IF NOT EXISTS measurements (address TEXT NOT NULL, "
+        "timestamp INTEGER NOT NULL, protocol INTEGER, %s, "
+        "PRIMARY KEY (address, timestamp)) WITHOUT ROWID" % values,
+        "CREATE TABLE IF NOT EXISTS hourly (address TEXT NOT NULL, "
+        "hour INTEGER NOT NULL, %s, "
+        "PRIMARY KEY (address, hour)) WITHOUT ROWID" % statistics,
+        "CREATE TEMP TABLE IF NOT EXISTS batch (address TEXT NOT NULL, "
+        "timestamp INTEGER NOT NULL, protocol INTEGER, %s, "
+        "PRIMARY KEY (address, timestamp)) WITHOUT ROWID" % values,
+    ]
+
+
+class SQLiteStore(BackgroundWriter):
+    """Stores measurements in a SQLite database from a background thread,
+    usable as the callback of RuuviDaemon. Requires numpy for queries.
+
+    Measurements are written in batches, each in a single transaction, to
+    a database in WAL mode, so queries from other threads or processes
+    don't block writing. Each batch also updates hourly rollups of count,
+    sum, minimum and maximum of every field. Measurements older than
+    retention, and rollups older than rollup_retention, are deleted once
+    per prune_interval.
+
+    Arguments:
+            path (str): path of the database, created if needed.
+
+    Keyword arguments:
+            fields (iterable): RuuviTag attributes to store.
+                Defaults to ruuvitag.decoder.FIELDS.
+            batch_size (int): maximum number of measurements per
+                transaction. Defaults to 1000.
+            flush_interval (float): maximum time between transactions,
+                in seconds. Defaults to 1.0.
+            max_buffer (int): maximum number of measurements waiting to be
+                written, the oldest are dropped when exceeded.
+                Defaults to 100000.
+            retention (float): seconds to keep measurements for.
+                Defaults to None, forever.
+            rollup_retention (float): seconds to keep hourly rollups for.
+                Defaults to None, forever.
+            prune_interval (float): time between deleting expired rows,
+                in seconds. Defaults to 3600.
+    """
+
+    def __init__(
+        self,
+        path,
+        fields=FIELDS,
+        batch_size=1000,
+        flush_interval=1.0,
+        max_buffer=100000,
+        retention=None,
+        rollup_retention=None,
+        prune_interval=3600.0,
+    ):
+        super(SQLiteStore, self).__init__(batch_size, flush_interval, max_buffer)
+        self.path = path
+        self.fields = tuple(fields)
+        self.retention = retention
+        self.rollup_retention = rollup_retention
+        self.prune_interval = prune_interval
+
+        #: int: measurements written
+        self.rows_written = 0
+        #: int: measurements ignored, as already stored with the timestamp
+        self.rows_duplicate = 0
+        #: int: transactions committed
+        self.flushes = 0
+        #: float: duration of the last transaction, in seconds
+        self.last_flush_latency = float("nan")
+
+        columns = ("address", "timestamp", "protocol") + self.fields
+        self.__insert = "INSERT OR IGNORE INTO batch (%s) VALUES (%s)" % (
+            ", ".join(columns),
+            ", ".join("?" * len(columns)),
+        )
+        statistics = []
+        updates = []
+        for field in self.fields:
+            statistics += [
+                "COUNT(%s)" % field,
+                "TOTAL(%s)" % field,
+                "MIN(%s)" % field,
+                "MAX(%s)" % field,
+            ]
+            updates += [
+                "{0}_count = {0}_count + excluded.{0}_count".format(field),
+                "{0}_sum = {0}_sum + excluded.{0}_sum".format(field),
+                "{0}_min = MIN(COALESCE({0}_min, excluded.{0}_min), "
+                "COALESCE(excluded.{0}_min, {0}_min))".format(field),
+                "{0}_max = MAX(COALESCE({0}_max, excluded.{0}_max), "
+                "COALESCE(excluded.{0}_max, {0}_max))".format(field),
+            ]
+        # WHERE true resolves the ambiguity of ON CONFLICT after SELECT
+        self.__rollup = (
+            "INSERT INTO hourly SELECT address, timestamp - timestamp %% %i, %s "
+            "FROM batch WHERE true GROUP BY 1, 2 "
+            "ON CONFLICT (address, hour) DO UPDATE SET %s"
+            % (NS_PER_HOUR, ", ".join(statistics), ", ".join(updates))
+        )
+
+        connection = self._connect()
+        connection.close()
+
+        self.__connection = None
+        self.__pruned = None
+        self.__local = threading.local()
+
+    @property
+    def rows_dropped(self):
+        """Measurements dropped, as the buffer was full or writing failed."""
+        return self.dropped
+
+    def _connect(self):
+        """Returns a new connection to the database."""
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Durable at checkpoints only, a crash may lose the latest batches
+        connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in _schema(self.fields):
+            connection.execute(statement)
+        return connection
+
+    def add(self, tag):
+        """Buffer the current values of a RuuviTag for writing."""
+        row = (tag.address.lower(), tag.last_seen_ns, tag.protocol) + tuple(
+            getattr(tag, field) for field in self.fields
+        )
+        self._append(row)
+
+    def _run(self):
+        """Main-loop of the writer thread, with its own connection."""
+        self.__connection = self._connect()
+        self.__pruned = None
+        try:
+            super(SQLiteStore, self)._run()
+        finally:
+            self.__connection.close()
+            self.__connection = None
+
+    def _idle(self):
+        """Prune once per prune_interval."""
+        if self.__pruned is None or (
+            time.monotonic() - self.__pruned >= self.prune_interval
+        ):
+            self._prune(self.__connection)
+            self.__pruned = time.monotonic()
+
+    def _write(self, rows):
+        """Insert rows and update the rollups in a single transaction."""
+        connection = self.__connection
+        started = time.time()
+        try:
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(self.__insert, rows)
+                # Only roll up measurements not stored before
+                connection.execute(
+                    "DELETE FROM batch WHERE EXISTS (SELECT 1 FROM measurements "
+                    "WHERE measurements.address = batch.address "
+                    "AND measurements.timestamp = batch.timestamp)"
+                )
+                inserted = connection.execute(
+                    "INSERT INTO measurements SELECT * FROM batch"
+                ).rowcount
+                connection.execute(self.__rollup)
+                connection.execute("DELETE FROM batch")
+        except sqlite3.Error as e:
+            logger.error("Writing to SQLite failed: %s", e)
+            self.dropped += len(rows)
+            return
+        self.last_flush_latency = time.time() - started
+        self.rows_written += inserted
+        self.rows_duplicate += len(rows) - inserted
+        self.flushes += 1
+
+    def _prune(self, connection):
+        """Delete measurements and rollups older than their retention."""
+        now = time.time()
+        try:
+            with connection:
+                connection.execute("BEGIN")
+                # Delete per address, using the primary key
+                addresses = [
+                    row[0]
+                    for row in connection.execute("SELECT DISTINCT address FROM hourly")
+                ]
+                for table, column, retention in (
+                    ("measurements", "timestamp", self.retention),
+                    ("hourly", "hour", self.rollup_retention),
+                ):
+                    if retention is None:
+                        continue
+                    connection.executemany(
+                        "DELETE FROM %s WHERE address = ? AND %s < ?" % (table, column),
+                        [
+                            (address, int((now - retention) * NS_PER_SECOND))
+                            for address in addresses
+                        ],
+                    )
+        except sqlite3.Error as e:
+            logger.error("Pruning SQLite failed: %s", e)
+
+    def _reader(self):
+        """Returns the connection of the calling thread for queries."""
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = self.__local.connection = self._connect()
+        return connection
+
+    def addresses(self):
+        """Returns the addresses of stored tags."""
+        return [
+            row[0]
+            for row in self._reader().execute(
+                "SELECT DISTINCT address FROM hourly ORDER BY address"
+            )
+        ]
+
+    def query(self, address, start_ns=None, end_ns=None, fields=None):
+        """Returns the measurements of a tag as a structured array, with
+        a timestamp column (nanoseconds since epoch) followed by fields,
+        oldest first. Missing values are NaN.
+
+        Arguments:
+            address (str): MAC address of the tag.
+
+        Keyword arguments:
+            start_ns (int): earliest time, in nanoseconds since epoch.
+                Defaults to None, from the beginning.
+            end_ns (int): time to read until (exclusive), in nanoseconds
+                since epoch. Defaults to None, until the end.
+            fields (iterable): fields to return. Defaults to all stored.
+        """
+        import numpy as np
+
+        fields = self.fields if fields is None else tuple(fields)
+        dtype = np.dtype(
+            [("timestamp", np.int64)] + [(field, np.float64) for field in fields]
+        )
+        rows = self._reader().execute(
+            "SELECT timestamp, %s FROM measurements WHERE address = ? "
+            "AND timestamp >= ? AND timestamp < ? ORDER BY timestamp"
+            % ", ".join(self._checked(fields)),
+            self._range(address, start_ns, end_ns),
+        )
+        return np.array(rows.fetchall(), dtype=dtype)
+
+    def hourly(self, address, start_ns=None, end_ns=None, fields=None):
+        """Returns the hourly rollups of a tag as a structured array, with
+        columns hour (start, nanoseconds since epoch), and count, mean,
+        min and max of each field, such as temperature_mean.
+
+        Arguments and keyword arguments are those of query().
+        """
+        import numpy as np
+
+        fields = self.fields if fields is None else tuple(fields)
+        dtype = np.dtype(
+            [("hour", np.int64)]
+            + [
+                ("%s_%s" % (field, statistic), np.float64)
+                for field in fields
+                for statistic in ("count", "mean", "min", "max")
+            ]
+        )
+        columns = []
+        for field in self._checked(fields):
+            columns += [
+                "{0}_count".format(field),
+                # Division by zero is NULL in SQLite, NaN in the result
+                "{0}_sum / {0}_count".format(field),
+                "{0}_min".format(field),
+                "{0}_max".format(field),
+            ]
+        rows = self._reader().execute(
+            "SELECT hour, %s FROM hourly WHERE address = ? "
+            "AND hour >= ? AND hour < ? ORDER BY hour" % ", ".join(columns),
+            self._range(address, start_ns, end_ns),
+        )
+        return np.array(rows.fetchall(), dtype=dtype)
+
+    def _checked(self, fields):
+        """Returns fields, raising ValueError for any not stored, as they
+        are used as column names."""
+        for field in fields:
+            if field not in self.fields:
+                raise ValueError("%r is not a stored field" % (field,))
+        return fields
+
+    @staticmethod
+    def _range(address, start_ns, end_ns):
+        """Returns query parameters of a tag and time range."""
+        return (
+            address.lower(),
+            -(2**63) if start_ns is None else start_ns,
+            2**63 - 1 if end_ns is None else end_ns,
+        )
@@ -0,0 +1,99 @@
+import threading
+from collections import deque
+
+
+class BackgroundWriter(object):
+    """Base class of sinks writing tags in batches from a background
+    thread. Adding tags never blocks on writing, so an instance can be used
+    directly as the callback of RuuviDaemon.
+
+    Subclasses buffer items with _append() in add(), and write them in
+    _write(). Batches are written when batch_size items are buffered or
+    every flush_interval seconds, and the remaining items on stop(). When
+    the buffer is full the oldest items are dropped.
+
+    Arguments:
+            batch_size (int): maximum number of items per write.
+            flush_interval (float): maximum time between writes, in
+                seconds.
+            max_buffer (int): maximum number of items waiting to be
+                written, None for unbounded.
+    """
+
+    def __init__(self, batch_size, flush_interval, max_buffer):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        #: int: items dropped, as the buffer was full or writing failed
+        self.dropped = 0
+
+        self._stop = threading.Event()
+        self.__buffer = deque(maxlen=max_buffer)
+        self.__condition = threading.Condition()
+        self.__thread = None
+
+    def __call__(self, tag, is_new=False):
+        """Add the tag, with the signature of a RuuviDaemon callback."""
+        self.add(tag)
+
+    def add(self, tag):
+        """Buffer the current values of a RuuviTag for writing."""
+        raise NotImplementedError
+
+    def _append(self, item):
+        """Buffer an item for writing."""
+        with self.__condition:
+            if len(self.__buffer) == self.__buffer.maxlen:
+                self.dropped += 1
+            self.__buffer.append(item)
+            if len(self.__buffer) >= self.batch_size:
+                self.__condition.notify()
+
+    def start(self):
+        """Start the background writer thread."""
+        self._stop.clear()
+        self.__thread = threading.Thread(target=self._run, name=type(self).__name__)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the writer thread, after writing the buffered items."""
+        self._stop.set()
+        with self.__condition:
+            self.__condition.notify()
+        if self.__thread:
+            self.__thread.join(timeout)
+            self.__thread = None
+
+    def _take(self):
+        """Remove and return the next batch of items from the buffer."""
+        with self.__condition:
+            count = min(self.batch_size, len(self.__buffer))
+            return [self.__buffer.popleft() for _ in range(count)]
+
+    def _drain(self):
+        """Write all buffered items, in batches."""
+        batch = self._take()
+        while batch:
+            self._write(batch)
+            batch = self._take()
+
+    def _run(self):
+        """Main-loop of the writer thread."""
+        while not self._stop.is_set():
+            with self.__condition:
+                if len(self.__buffer) < self.batch_size:
+                    self.__condition.wait(self.flush_interval)
+            batch = self._take()
+            if batch:
+                self._write(batch)
+            self._idle()
+        self._drain()
+
+    def _write(self, items):
+        """Write a batch of items, called from the writer thread."""
+        raise NotImplementedError
+
+    def _idle(self):
+        """Called by the writer thread after each wait, for periodic
+        work."""
@@ -19,14 +19,20 @@ setup(
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
         "License :: OSI Approved :: MIT License",
-        "Programming Language :: Python :: 2.7",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.7",
         "Topic :: Home Automation",
         "Topic :: Software Development :: Libraries",
     ],
+    python_requires=">=3.7",
     install_requires=[
         "bitstring>=3.1.5",
         "bluepy>=1.3.0",
         "arrow>=1.2.1",
     ],
+    extras_require={
+        "numpy": ["numpy>=1.16"],
+        "archive": ["pyarrow>=7.0"],
+    },
 )
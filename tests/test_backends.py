@@ -0,0 +1,67 @@
+import unittest
+
+from ruuvitag.backends import Advertisement, parse_hci_event
+
+PAYLOAD = bytes.fromhex("0201061bff990403291a1ece1efc18f94202ca0b53")
+
+
+def report(address, data, rssi):
+    """Returns an advertising report: event type, address type, address
+    (little-endian), length of data, data and rssi."""
+    return (
+        b"\x00\x01"
+        + bytes.fromhex(address.replace(":", ""))[::-1]
+        + bytes([len(data)])
+        + data
+        + bytes([rssi & 0xFF])
+    )
+
+
+def event(*reports):
+    """Returns an LE Advertising Report event as read from an HCI socket."""
+    parameters = b"\x02" + bytes([len(reports)]) + b"".join(reports)
+    return b"\x04\x3e" + bytes([len(parameters)]) + parameters
+
+
+class ParseHCIEventTest(unittest.TestCase):
+    def test_report(self):
+        self.assertEqual(
+            parse_hci_event(event(report("f7:bf:87:46:6f:ee", PAYLOAD, -70))),
+            [Advertisement("f7:bf:87:46:6f:ee", -70, PAYLOAD)],
+        )
+
+    def test_several_reports(self):
+        advertisements = parse_hci_event(
+            event(
+                report("f7:bf:87:46:6f:ee", PAYLOAD, -70),
+                report("c3:d4:00:11:22:33", b"", 5),
+            )
+        )
+        self.assertEqual(
+            advertisements,
+            [
+                Advertisement("f7:bf:87:46:6f:ee", -70, PAYLOAD),
+                Advertisement("c3:d4:00:11:22:33", 5, b""),
+            ],
+        )
+
+    def test_truncated_report(self):
+        packet = event(
+            report("f7:bf:87:46:6f:ee", PAYLOAD, -70),
+            report("c3:d4:00:11:22:33", PAYLOAD, -80),
+        )
+        self.assertEqual(
+            parse_hci_event(packet[:-1]),
+            [Advertisement("f7:bf:87:46:6f:ee", -70, PAYLOAD)],
+        )
+
+    def test_other_packets(self):
+        # LE Connection Complete, Command Complete and an ACL data packet
+        self.assertEqual(parse_hci_event(b"\x04\x3e\x13\x01" + b"\x00" * 18), [])
+        self.assertEqual(parse_hci_event(b"\x04\x0e\x04\x01\x0c\x20\x00"), [])
+        self.assertEqual(parse_hci_event(b"\x02\x01\x20\x00\x00"), [])
+        self.assertEqual(parse_hci_event(b"\x04\x3e"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import math
+import unittest
+
+import numpy as np
+
+from ruuvitag.batch import as_matrix, parse_many
+from ruuvitag.decoder import FIELDS
+from ruuvitag.ruuvitag import RuuviTag
+
+from test_ruuvitag import ADDRESS, random_payloads
+
+#: Values of format 5 fields decoded from the invalid sentinel of the
+#: specification, which parse_many reports as NaN.
+INVALID = {
+    "temperature": -163.84,
+    "humidity": 163.8375,
+    "pressure": 1155.35,
+    "acceleration_x": -32.768,
+    "acceleration_y": -32.768,
+    "acceleration_z": -32.768,
+    "battery_voltage": 3.647,
+    "tx_power": -9,
+    "movement_counter": 255,
+    "measurement_sequence": 65535,
+}
+
+#: Fields not in format 3, which parse_many reports as NaN.
+NOT_IN_FORMAT_3 = ("tx_power", "movement_counter", "measurement_sequence")
+
+
+class ParseManyTest(unittest.TestCase):
+    def test_same_values_as_parse(self):
+        payloads = random_payloads(5000)
+        result = parse_many([ADDRESS] * len(payloads), payloads)
+
+        for row, payload in zip(result, payloads):
+            tag = RuuviTag.parse(ADDRESS, payload)
+            self.assertEqual(row["address"], ADDRESS)
+            self.assertEqual(row["protocol"], tag.protocol)
+            for field in FIELDS:
+                value, expected = row[field], getattr(tag, field)
+                if math.isnan(value):
+                    if tag.protocol == 3:
+                        self.assertIn(field, NOT_IN_FORMAT_3)
+                    else:
+                        self.assertTrue(
+                            math.isclose(expected, INVALID[field]),
+                            (field, payload.hex()),
+                        )
+                else:
+                    self.assertEqual(value, expected, (field, payload.hex()))
+
+    def test_without_ruuvi_data(self):
+        payloads = [
+            bytes.fromhex("0201061aff4c00"),
+            # Truncated
+            bytes.fromhex("0201061bff99040512fc5394"),
+            b"",
+            None,
+        ]
+        result = parse_many([ADDRESS] * len(payloads), payloads)
+
+        self.assertEqual(result["protocol"].tolist(), [0, 0, 0, 0])
+        self.assertTrue(all(math.isnan(value) for value in result["temperature"]))
+
+    def test_as_matrix_into_out(self):
+        out = np.full((3, 8), 0xFF, dtype=np.uint8)
+        matrix, lengths = as_matrix([b"\x01\x02", b"\x03"], out=out)
+
+        self.assertEqual(matrix.tolist(), [[1, 2] + [0] * 6, [3] + [0] * 7])
+        self.assertEqual(lengths.tolist(), [2, 1])
+        self.assertTrue(np.shares_memory(matrix, out))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import unittest
+
+from ruuvitag.backends import Advertisement
+from ruuvitag.capture import CaptureWriter, ReplayBackend, read_capture
+
+ADVERTISEMENTS = [
+    Advertisement(
+        "f7:bf:87:46:6f:ee",
+        -70,
+        bytes.fromhex("0201061bff990403291a1ece1efc18f94202ca0b53"),
+    ),
+    Advertisement("c3:d4:00:11:22:33", -100, b""),
+    Advertisement(
+        "f7:bf:87:46:6f:ef",
+        -42,
+        bytes.fromhex("0201061bff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f"),
+    ),
+]
+
+
+class CaptureTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "capture.bin")
+
+    def test_round_trip(self):
+        with CaptureWriter(self.path) as writer:
+            for i, advertisement in enumerate(ADVERTISEMENTS):
+                writer.write(advertisement, timestamp=1700000000123456789 + i)
+
+        self.assertEqual(
+            [
+                (timestamp, Advertisement(address, rssi, bytes(data)))
+                for timestamp, (address, rssi, data) in read_capture(self.path)
+            ],
+            [
+                (1700000000123456789 + i, advertisement)
+                for i, advertisement in enumerate(ADVERTISEMENTS)
+            ],
+        )
+
+    def test_append(self):
+        for advertisement in ADVERTISEMENTS:
+            with CaptureWriter(self.path) as writer:
+                writer.write(advertisement)
+
+        backend = ReplayBackend(self.path)
+        self.assertEqual(
+            [
+                Advertisement(address, rssi, bytes(data))
+                for address, rssi, data in backend
+            ],
+            ADVERTISEMENTS,
+        )
+
+    def test_timestamp_and_rssi(self):
+        started = time.time_ns()
+        with CaptureWriter(self.path) as writer:
+            writer.write(Advertisement("f7:bf:87:46:6f:ee", -200, None))
+            writer.write(Advertisement("f7:bf:87:46:6f:ee", None, b"\x00"))
+
+        (timestamp, first), (_, second) = read_capture(self.path)
+        self.assertGreaterEqual(timestamp, started)
+        self.assertLessEqual(timestamp, time.time_ns())
+        self.assertEqual((first.rssi, bytes(first.rawData)), (-128, b""))
+        self.assertEqual(second.rssi, 0)
+
+    def test_not_a_capture(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a capture file")
+        with self.assertRaises(ValueError):
+            list(read_capture(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
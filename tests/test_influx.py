@@ -0,0 +1,127 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from ruuvitag.influx import InfluxDBSink, to_line
+from ruuvitag.ruuvitag import RuuviTag
+
+
+class InfluxDB(HTTPServer):
+    """Stand-in for the write endpoint of InfluxDB, replying with the
+    queued status codes, then 204."""
+
+    def __init__(self):
+        super(InfluxDB, self).__init__(("127.0.0.1", 0), Handler)
+        #: list: bodies of the requests, as lists of lines
+        self.requests = []
+        #: list: status codes of the next replies
+        self.statuses = []
+
+    @property
+    def url(self):
+        return "http://%s:%i" % self.server_address
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append(body.decode("utf-8").splitlines())
+        status = self.server.statuses.pop(0) if self.server.statuses else 204
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def tag(sequence):
+    return RuuviTag(
+        "f7:bf:87:46:6f:ee",
+        5,
+        temperature=21.5,
+        measurement_sequence=sequence,
+    )
+
+
+class InfluxDBSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.server = InfluxDB()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def sink(self, **kwargs):
+        kwargs.setdefault("flush_interval", 0.05)
+        kwargs.setdefault("backoff", 0.01)
+        return InfluxDBSink(url=self.server.url, **kwargs)
+
+    def test_batching(self):
+        sink = self.sink(batch_size=4)
+        tags = [tag(sequence) for sequence in range(10)]
+        for t in tags:
+            sink.add(t)
+        sink.start()
+        sink.stop()
+
+        self.assertEqual([len(lines) for lines in self.server.requests], [4, 4, 2])
+        self.assertEqual(sink.points_written, 10)
+        self.assertEqual(sink.flushes, 3)
+        lines = sum(self.server.requests, [])
+        self.assertEqual(lines, [to_line(t) for t in tags])
+
+    def test_retry_after_server_error(self):
+        self.server.statuses = [503]
+        sink = self.sink()
+        sink.add(tag(1))
+        sink.start()
+        sink.stop()
+
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.requests[0], self.server.requests[1])
+        self.assertEqual(sink.points_written, 1)
+        self.assertEqual(sink.points_dropped, 0)
+
+    def test_client_error_drops_batch(self):
+        self.server.statuses = [400]
+        sink = self.sink(batch_size=2)
+        for sequence in range(3):
+            sink.add(tag(sequence))
+        sink.start()
+        sink.stop()
+
+        # The first batch isn't retried, the second one is written
+        self.assertEqual([len(lines) for lines in self.server.requests], [2, 1])
+        self.assertEqual(sink.points_dropped, 2)
+        self.assertEqual(sink.points_written, 1)
+
+    def test_points_without_fields_are_skipped(self):
+        sink = self.sink()
+        written = tag(1)
+        sink.add(RuuviTag("f7:bf:87:46:6f:ee", 3))
+        sink.add(written)
+        sink.start()
+        sink.stop()
+
+        self.assertEqual(self.server.requests, [[to_line(written)]])
+
+
+class ToLineTest(unittest.TestCase):
+    def test_nan_values_are_left_out(self):
+        line = to_line(RuuviTag("f7:bf:87:46:6f:ee", 3, temperature=21.5))
+        self.assertTrue(
+            line.startswith("ruuvitag,address=f7:bf:87:46:6f:ee,protocol=3 ")
+        )
+        self.assertEqual(line.split(" ")[1], "temperature=21.5")
+
+    def test_all_nan_values(self):
+        self.assertIsNone(to_line(RuuviTag("f7:bf:87:46:6f:ee", 3)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import struct
+import threading
+import unittest
+
+from ruuvitag.backends import Advertisement, FakeBackend
+from ruuvitag.ruuvidaemon import RuuviDaemon
+
+ADDRESS = "f7:bf:87:46:6f:ee"
+
+
+def format_3(temperature_fraction):
+    """Returns a protocol 3 payload of 26 degrees and the fraction."""
+    return (
+        bytes.fromhex("0201061bff990403291a")
+        + bytes([temperature_fraction])
+        + bytes.fromhex("ce1efc18f94202ca0b53")
+    )
+
+
+def format_5(sequence):
+    """Returns a protocol 5 payload with the measurement sequence."""
+    return (
+        bytes.fromhex("0201061bff990405")
+        + bytes.fromhex("12fc5394c37c0004fffc040cac3642")
+        + struct.pack(">H", sequence)
+        + bytes.fromhex("cbb8334c884f")
+    )
+
+
+class RuuviDaemonTest(unittest.TestCase):
+    def daemon(self, **kwargs):
+        self.received = []
+        kwargs.setdefault("interface_index", [0, 1])
+        return RuuviDaemon(
+            callback=lambda tag, is_new=False: self.received.append(tag.copy()),
+            backend=lambda index: FakeBackend([]),
+            **kwargs
+        )
+
+    def test_deduplicate_by_default_with_several_devices(self):
+        self.assertTrue(self.daemon().deduplicate)
+        self.assertFalse(self.daemon(interface_index=0).deduplicate)
+
+    def test_protocol_3_returning_to_earlier_values(self):
+        daemon = self.daemon()
+        for fraction in (30, 31, 30):
+            daemon.update_tag(Advertisement(ADDRESS, -70, format_3(fraction)), 0)
+
+        self.assertEqual(
+            [tag.temperature for tag in self.received], [26.3, 26.31, 26.3]
+        )
+        self.assertEqual(daemon.tags[ADDRESS].temperature, 26.3)
+        self.assertEqual(daemon.duplicate_payloads, 0)
+
+    def test_protocol_3_copy_from_other_device(self):
+        daemon = self.daemon()
+        daemon.update_tag(Advertisement(ADDRESS, -70, format_3(30)), 0)
+        daemon.update_tag(Advertisement(ADDRESS, -60, format_3(30)), 1)
+
+        self.assertEqual(len(self.received), 1)
+        self.assertEqual(daemon.duplicate_payloads, 1)
+        # The device receiving the tag best is remembered
+        self.assertEqual(daemon.tags[ADDRESS].interface_index, 1)
+
+    def test_protocol_5_late_copy_from_other_device(self):
+        daemon = self.daemon()
+        daemon.update_tag(Advertisement(ADDRESS, -70, format_5(5)), 0)
+        daemon.update_tag(Advertisement(ADDRESS, -70, format_5(6)), 0)
+        daemon.update_tag(Advertisement(ADDRESS, -70, format_5(5)), 1)
+        daemon.update_tag(Advertisement(ADDRESS, -70, format_5(6)), 1)
+        daemon.update_tag(Advertisement(ADDRESS, -70, format_5(7)), 1)
+
+        self.assertEqual([tag.measurement_sequence for tag in self.received], [5, 6, 7])
+        self.assertEqual(daemon.duplicate_sequences, 1)
+        self.assertEqual(daemon.duplicate_payloads, 1)
+        self.assertEqual(daemon.tags[ADDRESS].measurement_sequence, 7)
+
+    def test_protocol_5_wrapping_sequence(self):
+        daemon = self.daemon()
+        for sequence in (65533, 65534, 0, 1):
+            daemon.update_tag(Advertisement(ADDRESS, -70, format_5(sequence)), 0)
+
+        self.assertEqual(
+            [tag.measurement_sequence for tag in self.received], [65533, 65534, 0, 1]
+        )
+
+    def test_protocol_5_sequence_not_available(self):
+        daemon = self.daemon()
+        for fraction in range(5):
+            payload = bytearray(format_5(65535))
+            payload[9] = fraction
+            daemon.update_tag(Advertisement(ADDRESS, -70, bytes(payload)), 0)
+
+        self.assertEqual(len(self.received), 5)
+        self.assertEqual(daemon.duplicate_sequences, 0)
+
+    def test_upper_case_addresses(self):
+        daemon = self.daemon(allowed_addresses=[ADDRESS.upper()])
+        received = []
+        daemon.subscribe(ADDRESS, lambda tag, is_new=False: received.append(tag))
+        daemon.update_tag(Advertisement(ADDRESS.upper(), -70, format_5(1)), 0)
+
+        self.assertEqual(daemon.not_allowed, 0)
+        self.assertEqual(list(daemon.tags), [ADDRESS])
+        self.assertEqual(len(received), 1)
+
+    def test_callbacks_run_without_lock(self):
+        lost = []
+
+        def callback(tag, is_new=False):
+            # Would deadlock if called while holding the lock
+            daemon.expire()
+
+        def lost_callback(tag):
+            daemon.expire()
+            lost.append(tag.address)
+
+        daemon = RuuviDaemon(
+            callback=callback,
+            lost_callback=lost_callback,
+            tag_ttl=3600,
+            max_tags=1,
+            backend=FakeBackend([]),
+        )
+        thread = threading.Thread(
+            target=lambda: [
+                daemon.update_tag(Advertisement(address, -70, format_5(1)))
+                for address in (ADDRESS, "f7:bf:87:46:6f:ef")
+            ]
+        )
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(lost, [ADDRESS])
+        self.assertEqual(list(daemon.tags), ["f7:bf:87:46:6f:ef"])
+
+
+if __name__ == "__main__":
+    unittest.main()
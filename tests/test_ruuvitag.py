@@ -0,0 +1,75 @@
+import random
+import unittest
+
+from ruuvitag.decoder import FIELDS, FORMAT_3, FORMAT_5
+from ruuvitag.ruuvitag import RuuviTag
+
+ADDRESS = "f7:bf:87:46:6f:ee"
+
+
+def random_payloads(count, seed=0):
+    """Returns count advertisements of formats 3 and 5 with random
+    values."""
+    rng = random.Random(seed)
+    payloads = []
+    for _ in range(count):
+        data_format, size = rng.choice(((3, FORMAT_3.size), (5, FORMAT_5.size)))
+        payloads.append(
+            bytes.fromhex("0201061bff9904")
+            + bytes([data_format])
+            + bytes(rng.getrandbits(8) for _ in range(size))
+        )
+    return payloads
+
+
+class ParseTest(unittest.TestCase):
+    def assertSameValues(self, tag, expected):
+        self.assertEqual(tag.address, expected.address)
+        self.assertEqual(tag.protocol, expected.protocol)
+        for field in FIELDS:
+            value, expected_value = getattr(tag, field), getattr(expected, field)
+            if expected_value != expected_value:
+                self.assertNotEqual(value, value, field)
+            else:
+                self.assertEqual(value, expected_value, field)
+
+    def test_same_values_as_bitarray_parser(self):
+        for payload in random_payloads(2000):
+            with self.subTest(payload=payload.hex()):
+                self.assertSameValues(
+                    RuuviTag.parse(ADDRESS, payload),
+                    RuuviTag._parse_bitarray(ADDRESS, payload),
+                )
+
+    def test_format_3(self):
+        tag = RuuviTag.parse(
+            ADDRESS, bytes.fromhex("0201061bff990403291a1ece1efc18f94202ca0b53")
+        )
+        self.assertEqual(tag.protocol, 3)
+        self.assertEqual(tag.temperature, 26.3)
+        self.assertEqual(tag.humidity, 20.5)
+        self.assertEqual(tag.pressure, 1027.66)
+        self.assertEqual(tag.battery_voltage, 2.899)
+
+    def test_format_5(self):
+        tag = RuuviTag.parse(
+            ADDRESS,
+            bytes.fromhex(
+                "0201061bff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f"
+            ),
+        )
+        self.assertEqual(tag.protocol, 5)
+        self.assertEqual(tag.temperature, 24.3)
+        self.assertEqual(tag.humidity, 53.49)
+        self.assertEqual(tag.pressure, 1000.44)
+        self.assertEqual(tag.battery_voltage, 2.977)
+        self.assertEqual(tag.tx_power, -18)
+        self.assertEqual(tag.movement_counter, 66)
+        self.assertEqual(tag.measurement_sequence, 205)
+
+    def test_other_data(self):
+        self.assertIsNone(RuuviTag.parse(ADDRESS, bytes.fromhex("0201061aff4c00")))
+
+
+if __name__ == "__main__":
+    unittest.main()